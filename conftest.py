@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    """Превью считаются в фоне (posts.thumbnails): тест дожидается их
+    до снятия фикстур, пока его временный MEDIA_ROOT ещё на месте."""
+    yield
+    from posts import thumbnails
+    thumbnails.wait_pending(5)
@@ -1,14 +1,216 @@
-from django.contrib import admin
-from .models import Group, Post
+import datetime
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import F, Max, Min
+from django.shortcuts import render
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .cache import invalidate
+from .forms import PostImageMixin
+from .models import Group, Post, PostQuerySet
+from .search import fts_query, matching_posts_filter, search_available
+from .sharding import is_sharded
+
+# Сколько строк списка считается точно; дальше — оценка.
+EXACT_COUNT_LIMIT = 10000
+
+
+def pk_range_estimate(model):
+    """Оценка размера таблицы по диапазону pk: два поиска по индексу."""
+    pks = model._default_manager.order_by().values_list('pk', flat=True)
+    first = pks.order_by('pk').first()
+    if first is None:
+        return 0
+    return pks.order_by('-pk').first() - first + 1
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор без полного COUNT(*) по таблице.
+
+    Считает не больше EXACT_COUNT_LIMIT строк. Если их больше, для
+    списка без фильтров берётся оценка по диапазону pk, для списка
+    с фильтрами — сам лимит.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        exact = queryset.order_by()[:EXACT_COUNT_LIMIT + 1].count()
+        if exact <= EXACT_COUNT_LIMIT:
+            return exact
+        if queryset.query.where:
+            return EXACT_COUNT_LIMIT
+        return max(exact, pk_range_estimate(queryset.model))
+
+
+def _periods(first, last, kind):
+    if kind == 'year':
+        start = datetime.date(first.year, 1, 1)
+    elif kind == 'month':
+        start = first.replace(day=1)
+    else:
+        start = first
+    while start <= last:
+        if kind == 'year':
+            end = datetime.date(start.year + 1, 1, 1)
+        elif kind == 'month':
+            end = (start.replace(day=28) + datetime.timedelta(days=4)).replace(
+                day=1
+            )
+        else:
+            end = start + datetime.timedelta(days=1)
+        yield start, end
+        start = end
+
+
+def _aware(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time()))
+
+
+class IndexedDatesQuerySet(PostQuerySet):
+    """Queryset списка постов для date_hierarchy без прохода по таблице.
+
+    Границы дат берутся двумя поисками по индексу pub_date, а каждый
+    год, месяц или день проверяется exists() по диапазону дат.
+    """
+
+    def aggregate(self, *args, **kwargs):
+        # date_hierarchy запрашивает Min и Max одним агрегатом, и SQLite
+        # читает весь индекс. Поодиночке это поиск первой строки.
+        if args or not kwargs or not all(
+            type(agg) in (Min, Max)
+            and isinstance(agg.source_expressions[0], F)
+            for agg in kwargs.values()
+        ):
+            return super().aggregate(*args, **kwargs)
+        result = {}
+        for alias, agg in kwargs.items():
+            field = agg.source_expressions[0].name
+            order = field if isinstance(agg, Min) else f'-{field}'
+            result[alias] = self.filter(
+                **{f'{field}__isnull': False}
+            ).order_by(order).values_list(field, flat=True).first()
+        return result
+
+    def dates(self, field_name, kind, order='ASC'):
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds['first'] is None:
+            return []
+        found = [
+            start
+            for start, end in _periods(
+                timezone.localtime(bounds['first']).date(),
+                timezone.localtime(bounds['last']).date(),
+                kind,
+            )
+            if self.filter(**{
+                f'{field_name}__gte': _aware(start),
+                f'{field_name}__lt': _aware(end),
+            }).exists()
+        ]
+        return found[::-1] if order == 'DESC' else found
+
+
+class MoveToGroupForm(forms.Form):
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        required=False,
+        label='Группа',
+        widget=AutocompleteSelect(
+            Post._meta.get_field('group').remote_field, admin.site
+        ),
+    )
+
+
+def move_posts_to_group(queryset, group):
+    """Переносит посты в группу одним UPDATE и сбрасывает их ленты."""
+    tags = {'feed'}
+    affected = queryset.order_by().values_list(
+        'author_id', 'group_id'
+    ).distinct()
+    for author_id, group_id in affected:
+        tags.add(f'author:{author_id}')
+        if group_id:
+            tags.add(f'group:{group_id}')
+    if group is not None:
+        tags.add(f'group:{group.pk}')
+    with transaction.atomic():
+        moved = queryset.update(group=group)
+        invalidate(*tags)
+    return moved
+
+
+class PostAdminForm(PostImageMixin, forms.ModelForm):
+    class Meta:
+        model = Post
+        fields = '__all__'
 
 
 class PostAdmin(admin.ModelAdmin):
+    form = PostAdminForm
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
     empty_value_display = '-пусто-'
-    list_editable = ('group',)
+    raw_id_fields = ('author',)
+    autocomplete_fields = ('group',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('move_to_group',)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return IndexedDatesQuerySet(
+            self.model, query=queryset.query, using=queryset.db
+        )
+
+    def get_readonly_fields(self, request, obj=None):
+        # На нескольких шардах пост лежит в базе автора: новому автору
+        # его переносит move_author, а не правка поля.
+        if obj is not None and is_sharded():
+            return ('author',)
+        return super().get_readonly_fields(request, obj)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Полнотекстовый индекс вместо LIKE '%q%' по всем постам.
+        if fts_query(search_term) and search_available():
+            return queryset.filter(**matching_posts_filter(search_term)), False
+        return super().get_search_results(request, queryset, search_term)
+
+    def move_to_group(self, request, queryset):
+        data = request.POST if 'apply' in request.POST else None
+        form = MoveToGroupForm(data)
+        if form.is_valid():
+            moved = move_posts_to_group(queryset, form.cleaned_data['group'])
+            self.message_user(
+                request, f'Перенесено постов: {moved}.', messages.SUCCESS
+            )
+            return None
+        return render(request, 'admin/posts/post/move_to_group.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Перенести в группу',
+            'opts': self.model._meta,
+            'form': form,
+            'media': self.media + form.media,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+        })
+    move_to_group.short_description = 'Перенести в группу'
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug')
+    search_fields = ('title', 'slug')
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
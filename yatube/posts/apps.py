@@ -1,5 +1,20 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def _ensure_search_triggers(using, **kwargs):
+    from django.db import connections
+
+    from .search import ensure_search_triggers
+    ensure_search_triggers(connections[using])
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .db import configure_connection
+        connection_created.connect(configure_connection)
+        post_migrate.connect(_ensure_search_triggers, sender=self)
@@ -0,0 +1,166 @@
+"""Версионированный кеш страниц ленты с инвалидацией по тегам.
+
+Ключ страницы включает текущие версии её тегов ('feed', 'group:<id>',
+'author:<id>', 'post:<id>'). Сигналы моделей увеличивают версии
+затронутых тегов, и старые ключи просто перестают запрашиваться —
+поэтому записи живут долго, а изменения видны сразу.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+from .models import Post
+from .routers import replica_cache_timeout
+from .utils import CursorPage, CursorPaginator
+
+TAG_PREFIX = 'tag:'
+
+
+def _initial_version():
+    # Версия после вытеснения тега не совпадёт ни с одной прежней.
+    return int(time.time() * 1000)
+
+
+def tag_versions(tags):
+    keys = [TAG_PREFIX + tag for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_tags(*tags):
+    for tag in tags:
+        key = TAG_PREFIX + tag
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+
+
+def invalidate(*tags):
+    """Сбрасывает теги сразу и ещё раз после коммита.
+
+    Повтор после коммита закрывает гонку: конкурентный запрос мог между
+    первым сбросом и коммитом закешировать старые данные под новой
+    версией тега.
+    """
+    bump_tags(*tags)
+    transaction.on_commit(lambda: bump_tags(*tags))
+
+
+def post_tags(post):
+    tags = ['feed', f'author:{post.author_id}', f'post:{post.pk}']
+    if post.group_id:
+        tags.append(f'group:{post.group_id}')
+    return tags
+
+
+def freeze_page(page):
+    """Снимок страницы без queryset: его можно положить в кеш."""
+    data = {'object_list': list(page.object_list)}
+    if isinstance(page, CursorPage):
+        data['cursor'] = (page.has_next(), page.has_previous())
+    else:
+        data['number'] = page.number
+        data['count'] = page.paginator.count
+    return data
+
+
+def thaw_page(data, per_page):
+    object_list = data['object_list']
+    if 'cursor' in data:
+        has_next, has_previous = data['cursor']
+        paginator = CursorPaginator(Post.objects.none(), per_page)
+        return CursorPage(object_list, paginator, has_next, has_previous)
+    paginator = Paginator([], per_page)
+    paginator.count = data['count']
+    return Page(object_list, data['number'], paginator)
+
+
+def cached_feed_page(request, name, tags, build_page):
+    """Страница ленты из кеша; build_page вызывается только при промахе."""
+    query = '&'.join(
+        f'{param}={request.GET.get(param, "")}'
+        for param in ('page', 'after', 'before')
+    )
+    versions = '.'.join(str(version) for version in tag_versions(tags))
+    key = 'feed:{}:{}:{}:{}'.format(
+        name,
+        settings.PAGINATION_MODE,
+        versions,
+        hashlib.md5(query.encode()).hexdigest(),
+    )
+    data = cache.get(key)
+    if data is not None:
+        return thaw_page(data, settings.OBJ_IN_PAGE)
+    page = build_page()
+    cache.set(
+        key,
+        freeze_page(page),
+        replica_cache_timeout(settings.FEED_CACHE_TIMEOUT),
+    )
+    return page
+
+
+def add_page_tags(request, *tags):
+    """Помечает ответ тегами для кеша целых страниц (PageCacheMiddleware).
+
+    Версии фиксируются до чтения содержимого страницы: изменение во
+    время рендера сделает запись устаревшей, а не потерянной.
+    """
+    tags = [tag for tag in tags if tag]
+    page_tags = getattr(request, 'page_cache_tags', {})
+    page_tags.update(zip(tags, tag_versions(tags)))
+    request.page_cache_tags = page_tags
+
+
+def page_etag(request, tags):
+    """ETag страницы: версии тегов, пользователь, параметры пагинации."""
+    parts = [str(version) for version in tag_versions(tags)]
+    parts += [
+        str(request.user.pk or 'anon'),
+        settings.PAGINATION_MODE,
+        str(timezone.now().year),
+        request.GET.urlencode(),
+    ]
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def conditional_page(validators):
+    """Условный GET (ETag / 304) без рендера страницы.
+
+    validators(request, **kwargs) возвращает теги страницы не больше чем
+    одним индексным запросом или None, если объекта нет — тогда view
+    сама ответит 404. Last-Modified не отдаётся: правка, удаление,
+    комментарии и смена пользователя не двигают дату свежего поста, а
+    версии тегов в ETag меняются от всех них.
+    """
+    def decorator(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            result = validators(request, *args, **kwargs)
+            if result is None:
+                return view(request, *args, **kwargs)
+            etag = quote_etag(page_etag(request, result))
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                patch_vary_headers(response, ('Cookie',))
+            return response
+        return inner
+    return decorator
@@ -0,0 +1,31 @@
+from django.db.models import F
+
+from .models import AuthorStats, MediaFile, Post
+
+
+def bump_author_stats(user_id, field, delta):
+    """Атомарно сдвигает счётчик пользователя.
+
+    Строка счётчиков создаётся только при увеличении: уменьшение
+    приходит и при каскадном удалении самого пользователя.
+    """
+    stats = AuthorStats.objects.filter(user_id=user_id)
+    if not stats.update(**{field: F(field) + delta}) and delta > 0:
+        AuthorStats.objects.get_or_create(user_id=user_id)
+        stats.update(**{field: F(field) + delta})
+
+
+def bump_comments_count(post_id, delta, using=None):
+    Post.objects.using(using).filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def bump_media_refs(name, delta):
+    """Сдвигает число ссылок на файл; строка появляется с первой ссылкой."""
+    if not name:
+        return
+    files = MediaFile.objects.filter(name=name)
+    if not files.update(refs=F('refs') + delta) and delta > 0:
+        MediaFile.objects.get_or_create(name=name)
+        files.update(refs=F('refs') + delta)
@@ -0,0 +1,33 @@
+"""Профиль соединений SQLite: PRAGMA из settings.SQLITE_PRAGMAS."""
+import os
+import sqlite3
+
+from django.conf import settings
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Настраивает каждое новое соединение (сигнал connection_created)."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, getattr(settings, 'SQLITE_PRAGMAS', {}))
+
+
+def connect(path):
+    """Соединение sqlite3 с файлом вне DATABASES (KV store превью, общий
+    кеш): автокоммит и тот же профиль PRAGMA."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(
+        path,
+        timeout=settings.SQLITE_PRAGMAS.get('busy_timeout', 5000) / 1000,
+        isolation_level=None,
+    )
+    apply_pragmas(connection.cursor(), settings.SQLITE_PRAGMAS)
+    return connection
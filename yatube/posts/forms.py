@@ -1,9 +1,39 @@
 from django import forms
+from django.core.exceptions import ValidationError
 
 from .models import Post, Comment
+from .uploads import check_size, clean_image
 
 
-class PostForm(forms.ModelForm):
+class PostImageMixin:
+    """Проверки картинки поста (posts.uploads) для любой формы поста.
+
+    Обработчик загрузки глобальный и отбрасывает байты сверх
+    POST_IMAGE_MAX_BYTES: форма без этих проверок сохранила бы
+    обрезанный файл.
+    """
+
+    def clean(self):
+        # Файл сверх лимита обработчик загрузки сохранил не целиком, и
+        # ImageField счёл его битым: показываем настоящую причину.
+        upload = self.files.get('image')
+        if upload is not None:
+            try:
+                check_size(upload)
+            except ValidationError as error:
+                self._errors.pop('image', None)
+                self.add_error('image', error)
+        return super().clean()
+
+    def clean_image(self):
+        # ImageField уже проверил заголовок, но не размеры.
+        image = self.cleaned_data['image']
+        if image and image != self.initial.get('image'):
+            return clean_image(image)
+        return image
+
+
+class PostForm(PostImageMixin, forms.ModelForm):
 
     class Meta:
         model = Post
@@ -0,0 +1,80 @@
+"""KV store sorl-thumbnail в отдельном файле SQLite.
+
+Метаданные превью (имя файла, размеры) все процессы читают прямо из
+файла THUMBNAIL_KVSTORE_PATH в режиме WAL: холодный процесс находит
+готовое превью без обращения к файлам картинок, общего кеша и сети.
+Промахи не запоминаются, поэтому превью, построенное другим процессом
+(пулом posts.thumbnails или build_thumbnails), видно сразу.
+"""
+import os
+import threading
+
+from django.conf import settings
+from sorl.thumbnail.kvstores.base import KVStoreBase
+
+from .db import connect
+
+TABLE = 'thumbnail_kvstore'
+
+
+def kvstore_path():
+    if settings.THUMBNAIL_KVSTORE_PATH:
+        return settings.THUMBNAIL_KVSTORE_PATH
+    return os.path.join(settings.MEDIA_ROOT, 'cache', 'thumbnails.sqlite3')
+
+
+class KVStore(KVStoreBase):
+    def __init__(self):
+        super().__init__()
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        """Соединение потока; после fork и смены пути открывается новое."""
+        owner = (os.getpid(), kvstore_path())
+        if getattr(self._local, 'owner', None) != owner:
+            self._local.owner = owner
+            self._local.connection = self._connect(owner[1])
+        return self._local.connection
+
+    @staticmethod
+    def _connect(path):
+        connection = connect(path)
+        connection.execute(
+            f'CREATE TABLE IF NOT EXISTS {TABLE} '
+            '(key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID'
+        )
+        return connection
+
+    def _get_raw(self, key):
+        row = self.connection.execute(
+            f'SELECT value FROM {TABLE} WHERE key = ?', (key,)
+        ).fetchone()
+        return row and row[0]
+
+    def _set_raw(self, key, value):
+        self.connection.execute(
+            f'INSERT OR REPLACE INTO {TABLE} (key, value) VALUES (?, ?)',
+            (key, value),
+        )
+
+    def _delete_raw(self, *keys):
+        self.connection.executemany(
+            f'DELETE FROM {TABLE} WHERE key = ?', [(key,) for key in keys]
+        )
+
+    def _find_keys_raw(self, prefix):
+        # Диапазон по первичному ключу вместо LIKE: префикс может
+        # содержать % и _.
+        rows = self.connection.execute(
+            f'SELECT key FROM {TABLE} WHERE key >= ? AND key < ?',
+            (prefix, prefix + '\uffff'),
+        )
+        return [key for key, in rows]
+
+    def iter_raw(self, prefix):
+        """Пары (key, value) по префиксу курсором, без списка в памяти."""
+        return self.connection.execute(
+            f'SELECT key, value FROM {TABLE} WHERE key >= ? AND key < ?',
+            (prefix, prefix + '\uffff'),
+        )
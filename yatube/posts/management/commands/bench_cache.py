@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from posts.sqlitecache import SQLiteCache
+
+
+# Одинаковые параметры: без чистки в середине прогона.
+PARAMS = {'TIMEOUT': None, 'OPTIONS': {'MAX_ENTRIES': 100000}}
+
+
+def _backends(directory):
+    return (
+        ('locmem', lambda: LocMemCache('bench', PARAMS)),
+        ('file', lambda: FileBasedCache(
+            os.path.join(directory, 'file'), PARAMS
+        )),
+        ('sqlite', lambda: SQLiteCache(
+            os.path.join(directory, 'cache.sqlite3'), PARAMS
+        )),
+    )
+
+
+def _worker(factory, operations, results):
+    cache = factory()
+    hits = 0
+    for number in range(operations):
+        cache.incr('counter')
+        if cache.get(f'page:{number % 100}') is not None:
+            hits += 1
+    results.put(hits)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает кеши locmem, file (FileBasedCache) и sqlite '
+        '(posts.sqlitecache): операции в секунду в одном процессе, '
+        'incr из нескольких процессов и попадания в записи, '
+        'сделанные другим процессом.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=1000)
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument(
+            '--size', type=int, default=16, help='КиБ в значении'
+        )
+
+    def handle(self, *args, **options):
+        value = 'x' * options['size'] * 1024
+        with tempfile.TemporaryDirectory() as directory:
+            for label, factory in _backends(directory):
+                cache = factory()
+                self._single(label, cache, value, options['operations'])
+                self._shared(label, cache, factory, options)
+
+    def _single(self, label, cache, value, operations):
+        cache.set('counter', 0)
+        for operation, call in (
+            ('set', lambda number: cache.set(f'page:{number}', value)),
+            ('get', lambda number: cache.get(f'page:{number}')),
+            ('get_many', lambda number: cache.get_many(
+                [f'tag:{number % 10}', 'tag:feed']
+            )),
+            ('add', lambda number: cache.add(f'lock:{number}', 1)),
+            ('incr', lambda number: cache.incr('counter')),
+        ):
+            started = time.perf_counter()
+            for number in range(operations):
+                call(number)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{label} {operation}: {operations / elapsed:.0f} оп/с'
+            )
+
+    def _shared(self, label, cache, factory, options):
+        """Процессы после fork: каждый увеличивает общий счётчик и
+        читает страницы, записанные родителем после их запуска."""
+        cache.set('counter', 0)
+        for number in range(100):
+            cache.delete(f'page:{number}')
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        # Фабрику наследуют дочерние процессы: у locmem каждый получит
+        # свою копию, как воркер gunicorn.
+        workers = [
+            context.Process(
+                target=_worker, args=(factory, options['operations'], results)
+            )
+            for _ in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        for number in range(100):
+            cache.set(f'page:{number}', number)
+        started = time.perf_counter()
+        hits = sum(results.get() for _ in workers)
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        total = options['operations'] * options['processes']
+        self.stdout.write(
+            f'{label} {options["processes"]} процесса: '
+            f'{2 * total / elapsed:.0f} оп/с, счётчик '
+            f'{cache.get("counter")} из {total}, попаданий {hits} из {total}'
+        )
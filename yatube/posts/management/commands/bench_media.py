@@ -0,0 +1,161 @@
+import http.client
+import os
+import tempfile
+import threading
+import time
+from wsgiref.simple_server import (
+    ServerHandler, WSGIRequestHandler, WSGIServer,
+)
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import re_path
+from django.views.static import serve as static_serve
+
+from posts.storage import ContentAddressedStorage
+
+
+def _static(request, path):
+    # То же, что монтирует django.conf.urls.static.static() при DEBUG.
+    return static_serve(request, path, document_root=settings.MEDIA_ROOT)
+
+
+# ROOT_URLCONF прогона «static()»: эта же команда.
+urlpatterns = [re_path(r'^media/(?P<path>.*)$', _static)]
+
+
+class SendfileHandler(ServerHandler):
+    """Как gunicorn: файл из wsgi.file_wrapper уходит через os.sendfile
+    с текущей позиции файла и длиной из Content-Length."""
+
+    enabled = True
+
+    def sendfile(self):
+        if not self.enabled:
+            return False
+        try:
+            fileno = self.result.filelike.fileno()
+        except (AttributeError, OSError):
+            return False
+        if not self.headers_sent:
+            self.send_headers()
+        length = int(self.headers['Content-Length'])
+        offset = os.lseek(fileno, 0, os.SEEK_CUR)
+        socket = self.request_handler.connection.fileno()
+        while length:
+            sent = os.sendfile(socket, fileno, offset, length)
+            if not sent:
+                break
+            offset += sent
+            length -= sent
+        return True
+
+
+class RequestHandler(WSGIRequestHandler):
+    def handle(self):
+        self.raw_requestline = self.rfile.readline(65537)
+        if not self.parse_request():
+            return
+        handler = SendfileHandler(
+            self.rfile, self.wfile, self.get_stderr(), self.get_environ(),
+            multithread=False,
+        )
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает отдачу MEDIA_URL через static() и posts.media: '
+        'целый файл, повторный запрос с валидаторами и Range. Сервер '
+        'отдаёт файлы через sendfile, как gunicorn.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=4, help='МиБ')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument(
+            '--no-sendfile', action='store_true',
+            help='копировать файл через Python, как wsgiref',
+        )
+
+    def handle(self, *args, **options):
+        SendfileHandler.enabled = not options['no_sendfile']
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root
+        ):
+            name = ContentAddressedStorage().save(
+                'posts/bench.jpg',
+                ContentFile(os.urandom(options['size'] * 2 ** 20)),
+            )
+            middleware = [
+                path for path in settings.MIDDLEWARE
+                if path != 'posts.middleware.MediaMiddleware'
+            ]
+            with override_settings(
+                MIDDLEWARE=middleware, ROOT_URLCONF=__name__
+            ):
+                self._bench('static()', WSGIHandler(), name, options)
+            self._bench('posts.media', WSGIHandler(), name, options)
+
+    def _bench(self, label, application, name, options):
+        server = WSGIServer(('127.0.0.1', 0), RequestHandler)
+        server.set_app(application)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = settings.MEDIA_URL + name
+            status, headers, _ = self._get(server, url, {})
+            validators = {}
+            if 'ETag' in headers:
+                validators['If-None-Match'] = headers['ETag']
+            if 'Last-Modified' in headers:
+                validators['If-Modified-Since'] = headers['Last-Modified']
+            for scenario, request_headers in (
+                ('целиком', {}),
+                ('повторно', validators),
+                ('Range 64 КиБ', {'Range': 'bytes=-65536'}),
+            ):
+                self._run(
+                    server, url, request_headers, options['requests'],
+                    f'{label} {scenario}',
+                )
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def _run(self, server, url, headers, requests, label):
+        received, statuses = 0, set()
+        started = time.perf_counter()
+        for _ in range(requests):
+            status, _, size = self._get(server, url, headers)
+            received += size
+            statuses.add(status)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{label}: {requests / elapsed:.0f} запр/с, '
+            f'{received / elapsed / 2 ** 20:.0f} MiB/с, '
+            f'статус {",".join(map(str, sorted(statuses)))}'
+        )
+
+    @staticmethod
+    def _get(server, url, headers):
+        connection = http.client.HTTPConnection(*server.server_address)
+        try:
+            connection.request('GET', url, headers=headers)
+            response = connection.getresponse()
+            size = 0
+            while True:
+                chunk = response.read(2 ** 20)
+                if not chunk:
+                    break
+                size += len(chunk)
+            return response.status, dict(response.getheaders()), size
+        finally:
+            connection.close()
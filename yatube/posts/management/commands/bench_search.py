@@ -0,0 +1,96 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+WORDS = (
+    'кот пёс дом лес река город поле небо море гора сад двор мост путь '
+    'друг день ночь свет снег дождь ветер огонь вода земля время жизнь '
+    'книга песня музыка кино школа работа отпуск праздник вечер утро'
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск LIKE и FTS5 на синтетическом корпусе во '
+        'временной базе (рабочая база не затрагивается).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--words', type=int, default=30)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        # Длинный хвост словаря и редкое слово дают разную селективность.
+        vocabulary = WORDS + [f'слово{i}ъ' for i in range(5000)]
+        with tempfile.TemporaryDirectory() as directory:
+            db = sqlite3.connect(os.path.join(directory, 'bench.sqlite3'))
+            self._build(db, vocabulary, rng, options)
+            for term in ('кот', 'слово42ъ', 'уникум', 'кот река'):
+                for mode in ('top', 'count'):
+                    like = self._time(db, options['repeat'], term, mode, False)
+                    fts = self._time(db, options['repeat'], term, mode, True)
+                    self.stdout.write(
+                        f'{term!r} [{mode}]: LIKE {like * 1000:.1f} ms, '
+                        f'FTS5 {fts * 1000:.1f} ms, '
+                        f'x{like / max(fts, 1e-6):.0f}'
+                    )
+            db.close()
+
+    def _build(self, db, vocabulary, rng, options):
+        started = time.perf_counter()
+        db.execute('CREATE TABLE posts_post (id INTEGER PRIMARY KEY, text)')
+        db.execute(
+            "CREATE VIRTUAL TABLE posts_post_fts USING fts5(text, "
+            "content='posts_post', content_rowid='id')"
+        )
+        batch = []
+        for pk in range(1, options['posts'] + 1):
+            words = rng.choices(vocabulary, k=options['words'])
+            if pk % 10000 == 0:
+                words.append('уникум')
+            batch.append((pk, ' '.join(words)))
+            if len(batch) == 10000:
+                db.executemany('INSERT INTO posts_post VALUES (?, ?)', batch)
+                batch = []
+        db.executemany('INSERT INTO posts_post VALUES (?, ?)', batch)
+        db.execute(
+            "INSERT INTO posts_post_fts(posts_post_fts) VALUES ('rebuild')"
+        )
+        db.commit()
+        self.stdout.write(
+            f'Корпус: {options["posts"]} постов за '
+            f'{time.perf_counter() - started:.1f} с'
+        )
+
+    @staticmethod
+    def _search(db, term, mode, fts):
+        """top — первые 10 результатов, count — число совпадений
+        (его считает changelist админки)."""
+        if fts:
+            where, params = 'posts_post_fts MATCH ?', [term]
+            table, order = 'posts_post_fts', 'bm25(posts_post_fts)'
+        else:
+            where = ' AND '.join('text LIKE ?' for _ in term.split())
+            params = [f'%{word}%' for word in term.split()]
+            table, order = 'posts_post', 'id DESC'
+        if mode == 'count':
+            sql = f'SELECT COUNT(*) FROM {table} WHERE {where}'
+        else:
+            sql = f'SELECT rowid FROM {table} WHERE {where} ' \
+                f'ORDER BY {order} LIMIT 10'
+        return db.execute(sql, params).fetchall()
+
+    def _time(self, db, repeat, term, mode, fts):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            self._search(db, term, mode, fts)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
@@ -0,0 +1,162 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.db import apply_pragmas
+
+# Профиль до изменений: настройки sqlite3 по умолчанию и новое соединение
+# на каждый запрос (CONN_MAX_AGE = 0).
+DEFAULT_PROFILE = {'pragmas': {}, 'timeout': 5, 'persistent': False}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность смешанной нагрузки чтения и '
+        'записи с настройками SQLite по умолчанию и с SQLITE_PRAGMAS. '
+        'Работает во временной базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=50_000)
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument(
+            '--write-ratio', type=float, default=0.2,
+            help='доля операций записи',
+        )
+
+    def handle(self, *args, **options):
+        tuned = {
+            'pragmas': settings.SQLITE_PRAGMAS,
+            'timeout': settings.DATABASES['default']['OPTIONS']['timeout'],
+            'persistent': True,
+        }
+        for label, profile in (('default', DEFAULT_PROFILE),
+                               ('tuned', tuned)):
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self._build(path, options['posts'])
+                stats = self._run(path, profile, options)
+            total = stats['reads'] + stats['writes']
+            self.stdout.write(
+                f'{label}: {total / options["seconds"]:.0f} оп/с '
+                f'(чтений {stats["reads"]}, записей {stats["writes"]}, '
+                f'locked {stats["locked"]}, '
+                f'p99 записи {stats["p99"] * 1000:.1f} ms)'
+            )
+
+    @staticmethod
+    def _build(path, posts):
+        db = sqlite3.connect(path)
+        db.executescript('''
+            CREATE TABLE posts_post (
+                id INTEGER PRIMARY KEY, text TEXT, pub_date REAL,
+                author_id INTEGER, comments_count INTEGER DEFAULT 0
+            );
+            CREATE INDEX post_pub_date_id_idx
+                ON posts_post (pub_date DESC, id DESC);
+            CREATE TABLE posts_comment (
+                id INTEGER PRIMARY KEY, post_id INTEGER, text TEXT,
+                created REAL
+            );
+            CREATE INDEX comment_post_created_idx
+                ON posts_comment (post_id, created, id);
+        ''')
+        db.executemany(
+            'INSERT INTO posts_post (text, pub_date, author_id) '
+            'VALUES (?, ?, ?)',
+            ((f'Пост {i} ' * 20, i, i % 100) for i in range(posts)),
+        )
+        db.commit()
+        db.close()
+
+    def _run(self, path, profile, options):
+        stats = {'reads': 0, 'writes': 0, 'locked': 0, 'latencies': []}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['seconds']
+
+        def worker(seed):
+            local = self._work(path, profile, options, deadline, seed)
+            with lock:
+                for key, value in local.items():
+                    stats[key] += value
+
+        threads = [
+            threading.Thread(target=worker, args=(seed,))
+            for seed in range(options['workers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        latencies = sorted(stats['latencies']) or [0]
+        stats['p99'] = latencies[int(len(latencies) * 0.99) - 1]
+        return stats
+
+    @staticmethod
+    def _connect(path, profile):
+        db = sqlite3.connect(
+            path, timeout=profile['timeout'], isolation_level=None
+        )
+        apply_pragmas(db.cursor(), profile['pragmas'])
+        return db
+
+    def _work(self, path, profile, options, deadline, seed):
+        rng = random.Random(seed)
+        local = {'reads': 0, 'writes': 0, 'locked': 0, 'latencies': []}
+        db = self._connect(path, profile) if profile['persistent'] else None
+        while time.perf_counter() < deadline:
+            conn = db or self._connect(path, profile)
+            try:
+                if rng.random() < options['write_ratio']:
+                    started = time.perf_counter()
+                    self._write(conn, rng, options['posts'])
+                    local['latencies'].append(time.perf_counter() - started)
+                    local['writes'] += 1
+                else:
+                    self._read(conn, rng, options['posts'])
+                    local['reads'] += 1
+            except sqlite3.OperationalError:
+                local['locked'] += 1
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+            finally:
+                if db is None:
+                    conn.close()
+        if db is not None:
+            db.close()
+        return local
+
+    @staticmethod
+    def _read(conn, rng, posts):
+        # Страница ленты и пост с комментариями, как index и post_detail.
+        offset = rng.randrange(0, 100) * 10
+        conn.execute(
+            'SELECT id, text FROM posts_post '
+            'ORDER BY pub_date DESC, id DESC LIMIT 10 OFFSET ?', (offset,)
+        ).fetchall()
+        conn.execute(
+            'SELECT id, text FROM posts_comment WHERE post_id = ? '
+            'ORDER BY created, id LIMIT 20', (rng.randrange(posts),)
+        ).fetchall()
+
+    @staticmethod
+    def _write(conn, rng, posts):
+        # Как add_comment: комментарий и счётчик в одной транзакции.
+        post_id = rng.randrange(posts)
+        conn.execute('BEGIN')
+        conn.execute(
+            'INSERT INTO posts_comment (post_id, text, created) '
+            'VALUES (?, ?, ?)', (post_id, 'Комментарий', time.time()),
+        )
+        conn.execute(
+            'UPDATE posts_post SET comments_count = comments_count + 1 '
+            'WHERE id = ?', (post_id,),
+        )
+        conn.execute('COMMIT')
@@ -0,0 +1,122 @@
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from posts.writer import WriteQueue
+
+ALIAS = 'bench_writes'
+
+
+def _comment(post_id):
+    # Как add_comment: комментарий и счётчик поста.
+    with connections[ALIAS].cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO posts_comment (post_id, text, created) '
+            'VALUES (%s, %s, %s)', (post_id, 'Комментарий', time.time()),
+        )
+        cursor.execute(
+            'UPDATE posts_post SET comments_count = comments_count + 1 '
+            'WHERE id = %s', (post_id,),
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает всплеск записей из многих потоков: каждый поток пишет '
+        'сам или через очередь записи с групповым коммитом. Работает во '
+        'временной базе с профилем SQLITE_PRAGMAS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--writes', type=int, default=500,
+                            help='записей на поток')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            connections.databases[ALIAS] = dict(
+                connections.databases['default'],
+                NAME=os.path.join(directory, 'bench.sqlite3'),
+            )
+            try:
+                self._build()
+                for mode in ('direct', 'dispatch'):
+                    self._report(mode, self._run(mode, options), options)
+            finally:
+                connections[ALIAS].close()
+                del connections.databases[ALIAS]
+
+    @staticmethod
+    def _build():
+        with connections[ALIAS].cursor() as cursor:
+            cursor.execute(
+                'CREATE TABLE posts_post (id INTEGER PRIMARY KEY, '
+                'comments_count INTEGER DEFAULT 0)'
+            )
+            cursor.execute(
+                'CREATE TABLE posts_comment (id INTEGER PRIMARY KEY, '
+                'post_id INTEGER, text TEXT, created REAL)'
+            )
+            cursor.executemany(
+                'INSERT INTO posts_post (id) VALUES (%s)',
+                [(pk,) for pk in range(1000)],
+            )
+
+    def _run(self, mode, options):
+        writer = WriteQueue(using=ALIAS)
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def worker(seed):
+            rng = random.Random(seed)
+            local, failed = [], 0
+            for _ in range(options['writes']):
+                post_id = rng.randrange(1000)
+                started = time.perf_counter()
+                try:
+                    if mode == 'dispatch':
+                        writer.submit(_comment, post_id).result()
+                    else:
+                        with transaction.atomic(using=ALIAS):
+                            _comment(post_id)
+                except Exception:
+                    failed += 1
+                local.append(time.perf_counter() - started)
+            connections[ALIAS].close()
+            with lock:
+                latencies.extend(local)
+                errors.append(failed)
+
+        threads = [
+            threading.Thread(target=worker, args=(seed,))
+            for seed in range(options['workers'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {
+            'elapsed': time.perf_counter() - started,
+            'latencies': sorted(latencies),
+            'errors': sum(errors),
+            'batches': writer.batches,
+        }
+
+    def _report(self, mode, result, options):
+        latencies = result['latencies']
+        total = options['workers'] * options['writes']
+        line = (
+            f'{mode}: {total / result["elapsed"]:.0f} записей/с, '
+            f'p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, '
+            f'p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms, '
+            f'ошибок {result["errors"]}'
+        )
+        if result['batches']:
+            line += f', коммитов {result["batches"]}'
+        self.stdout.write(line)
@@ -0,0 +1,113 @@
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.cache import invalidate, post_tags
+from posts.models import Post
+from posts.thumbnails import build
+
+
+def _build(name, force):
+    try:
+        return build(name, force), None
+    except Exception as error:
+        return 0, f'{type(error).__name__}: {error}'
+
+
+def _shard_images(shard, start_after, batch_size):
+    queryset = Post.objects.using(shard).exclude(image='').only(
+        'pk', 'image', 'author_id', 'group_id'
+    ).order_by('pk')
+    last_pk = start_after
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return
+        yield from batch
+        last_pk = batch[-1].pk
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит все варианты картинок постов (srcset, форматы) в '
+        'пуле процессов. Готовые превью пропускаются, прерванный прогон '
+        'продолжается с --start-after.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='процессов; по умолчанию число ядер',
+        )
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument(
+            '--start-after', type=int, default=0,
+            help='pk, после которого продолжить (из последнего checkpoint)',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='перестроить и готовые превью',
+        )
+
+    def handle(self, *args, **options):
+        # Потомки не должны унаследовать открытые соединения.
+        connections.close_all()
+        posts = heapq.merge(
+            *(
+                _shard_images(
+                    shard, options['start_after'], options['batch_size']
+                )
+                for shard in settings.POST_SHARDS
+            ),
+            key=lambda post: post.pk,
+        )
+        self.totals = {'images': 0, 'built': 0, 'bytes': 0, 'errors': 0}
+        started = time.perf_counter()
+        with ProcessPoolExecutor(
+            max_workers=options['workers'], initializer=django.setup
+        ) as pool:
+            # Следующая пачка уже в пуле, пока ждём текущую.
+            in_flight = deque()
+            while True:
+                batch = list(itertools.islice(posts, options['batch_size']))
+                if batch:
+                    in_flight.append((batch, [
+                        pool.submit(_build, post.image.name, options['force'])
+                        for post in batch
+                    ]))
+                if in_flight and (len(in_flight) > 1 or not batch):
+                    self._finish(*in_flight.popleft())
+                if not in_flight:
+                    break
+        elapsed = time.perf_counter() - started
+        totals = self.totals
+        self.stdout.write(
+            f'картинок {totals["images"]}, построено {totals["built"]}, '
+            f'ошибок {totals["errors"]}, '
+            f'{totals["images"] / elapsed:.1f} картинок/с, '
+            f'записано {totals["bytes"] / 2 ** 20:.1f} MiB'
+        )
+
+    def _finish(self, batch, futures):
+        tags = set()
+        for post, future in zip(batch, futures):
+            written, error = future.result()
+            self.totals['images'] += 1
+            if error:
+                self.totals['errors'] += 1
+                self.stderr.write(f'{post.image.name}: {error}')
+            elif written:
+                self.totals['built'] += 1
+                self.totals['bytes'] += written
+                tags.update(post_tags(post))
+        # Закешированные страницы показывали исходные картинки.
+        invalidate(*tags)
+        self.stdout.write(f'checkpoint: {batch[-1].pk}')
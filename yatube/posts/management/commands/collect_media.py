@@ -0,0 +1,204 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+
+from posts.kvstore import KVStore, kvstore_path
+from posts.models import MediaFile, Post
+from posts.storage import INCOMING
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _scan(root):
+    """Файлы под root потоком. В памяти только открытые итераторы
+    scandir, по одному на уровень вложенности."""
+    if not os.path.isdir(root):
+        return
+    stack = [os.scandir(root)]
+    try:
+        while stack:
+            entry = next(stack[-1], None)
+            if entry is None:
+                stack.pop().close()
+            elif entry.is_dir(follow_symlinks=False):
+                stack.append(os.scandir(entry.path))
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+    finally:
+        for iterator in stack:
+            iterator.close()
+
+
+class ReferenceSet:
+    """Множество нужных имён во временном файле SQLite: десятки
+    миллионов путей не помещаются в память."""
+
+    def __init__(self, directory):
+        self.connection = sqlite3.connect(
+            os.path.join(directory, 'refs.sqlite3'), isolation_level=None
+        )
+        self.connection.execute('PRAGMA journal_mode = OFF')
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute(
+            'CREATE TABLE refs (name TEXT PRIMARY KEY) WITHOUT ROWID'
+        )
+
+    def add(self, names):
+        self.connection.execute('BEGIN')
+        self.connection.executemany(
+            'INSERT OR IGNORE INTO refs VALUES (?)', ((n,) for n in names)
+        )
+        self.connection.execute('COMMIT')
+
+    def missing(self, names):
+        placeholders = ', '.join('?' * len(names))
+        found = {name for name, in self.connection.execute(
+            f'SELECT name FROM refs WHERE name IN ({placeholders})', names
+        )}
+        return [name for name in names if name not in found]
+
+    def close(self):
+        self.connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов и превью, на которые ничего не '
+        'ссылается. Нужные имена берутся из постов всех шардов и из KV '
+        'store превью, MEDIA_ROOT обходится потоком; память не зависит '
+        'от числа файлов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='только посчитать, ничего не трогать',
+        )
+        parser.add_argument(
+            '--grace', type=float, default=24,
+            help='не трогать файлы моложе стольких часов; по умолчанию 24',
+        )
+        parser.add_argument(
+            '--quarantine', metavar='DIR',
+            help='переносить файлы в DIR вместо удаления',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.cutoff = time.time() - options['grace'] * 3600
+        self.totals = {'files': 0, 'garbage': 0, 'bytes': 0, 'young': 0}
+        roots = [Post._meta.get_field('image').upload_to, INCOMING]
+        self.kvstore = default.kvstore
+        if isinstance(self.kvstore, KVStore):
+            roots.append(sorl_settings.THUMBNAIL_PREFIX)
+        else:
+            # Без своего KV store не узнать, какие превью нужны.
+            self.stderr.write('KV store не posts.kvstore: превью пропущены')
+        with tempfile.TemporaryDirectory() as directory:
+            self.refs = ReferenceSet(directory)
+            try:
+                self._collect_refs()
+                for root in roots:
+                    self._sweep(os.path.join(settings.MEDIA_ROOT, root))
+            finally:
+                self.refs.close()
+        totals = self.totals
+        action = (
+            'пробный прогон' if options['dry_run']
+            else 'в карантине' if options['quarantine'] else 'удалено'
+        )
+        self.stdout.write(
+            f'файлов {totals["files"]}, не нужны {totals["garbage"]} '
+            f'({totals["bytes"] / 2 ** 20:.1f} MiB, {action}), '
+            f'моложе --grace {totals["young"]}'
+        )
+
+    def _collect_refs(self):
+        for shard in settings.POST_SHARDS:
+            images = Post.objects.using(shard).exclude(image='').values_list(
+                'image', flat=True
+            ).order_by()
+            for batch in _batches(
+                images.iterator(), self.options['batch_size']
+            ):
+                self.refs.add(batch)
+        if isinstance(self.kvstore, KVStore):
+            for batch in _batches(
+                self._thumbnail_refs(), self.options['batch_size']
+            ):
+                self.refs.add(batch)
+
+    def _thumbnail_refs(self):
+        """Превью, исходники которых ещё нужны, и файлы самого KV store."""
+        yield from (
+            os.path.relpath(kvstore_path() + suffix, settings.MEDIA_ROOT)
+            for suffix in ('', '-wal', '-shm', '-journal')
+        )
+        rows = self.kvstore.iter_raw(add_prefix('', 'thumbnails'))
+        for key, value in rows:
+            source = self.kvstore._get_raw(add_prefix(del_prefix(key)))
+            if not source or self.refs.missing([json.loads(source)['name']]):
+                continue
+            for thumbnail_key in json.loads(value):
+                thumbnail = self.kvstore._get_raw(add_prefix(thumbnail_key))
+                if thumbnail:
+                    yield json.loads(thumbnail)['name']
+
+    def _sweep(self, root):
+        for entries in _batches(_scan(root), self.options['batch_size']):
+            self.totals['files'] += len(entries)
+            names = {
+                os.path.relpath(entry.path, settings.MEDIA_ROOT): entry
+                for entry in entries
+            }
+            removed = []
+            for name in self.refs.missing(list(names)):
+                stat = names[name].stat(follow_symlinks=False)
+                if stat.st_mtime > self.cutoff:
+                    self.totals['young'] += 1
+                    continue
+                self.totals['garbage'] += 1
+                self.totals['bytes'] += stat.st_size
+                if not self.options['dry_run']:
+                    self._remove(name, names[name].path)
+                    removed.append(name)
+            self._forget(removed)
+
+    def _remove(self, name, path):
+        if self.options['quarantine'] is None:
+            os.remove(path)
+            return
+        target = os.path.join(self.options['quarantine'], name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(path, target)
+
+    def _forget(self, names):
+        """Убирает записи sorl и счётчики ссылок удалённых файлов: иначе
+        та же картинка, загруженная снова, получит ссылки на пропавшие
+        превью."""
+        if not names:
+            return
+        for name in names:
+            key = ImageFile(name).key
+            self.kvstore._delete(key)
+            self.kvstore._delete(key, identity='thumbnails')
+        MediaFile.objects.filter(name__in=names).delete()
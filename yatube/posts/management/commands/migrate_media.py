@@ -0,0 +1,100 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.cache import invalidate, post_tags
+from posts.counters import bump_media_refs
+from posts.models import MediaFile, Post
+from posts.storage import CONTENT_NAME
+
+LEGACY = Post.objects.exclude(image='').exclude(
+    image__regex=f'^{CONTENT_NAME.pattern}$'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов из плоского каталога в хранилище по '
+        'содержимому и переписывает пути в базе пачками. Файл читается '
+        'и пишется кусками; одинаковые файлы сливаются в один. '
+        'Повторный запуск продолжает с непереписанных постов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        self.storage = Post._meta.get_field('image').storage
+        self.totals = {'posts': 0, 'moved': 0, 'missing': 0, 'removed': 0}
+        for shard in settings.POST_SHARDS:
+            queryset = LEGACY.using(shard).only(
+                'pk', 'image', 'author_id', 'group_id'
+            ).order_by('pk')
+            last_pk = 0
+            while True:
+                batch = list(
+                    queryset.filter(pk__gt=last_pk)[:options['batch_size']]
+                )
+                if not batch:
+                    break
+                self._migrate(shard, batch)
+                last_pk = batch[-1].pk
+                self.stdout.write(f'{shard} checkpoint: {last_pk}')
+        totals = self.totals
+        self.stdout.write(
+            f'постов {totals["posts"]}, перенесено {totals["moved"]}, '
+            f'нет файла {totals["missing"]}, '
+            f'удалено старых файлов {totals["removed"]}'
+        )
+
+    def _migrate(self, shard, batch):
+        renamed = {}
+        for post in batch:
+            old = post.image.name
+            if old in renamed:
+                continue
+            if not self.storage.exists(old):
+                self.totals['missing'] += 1
+                self.stderr.write(f'{old}: файла нет')
+                continue
+            with self.storage.open(old) as file:
+                renamed[old] = self.storage.save(old, file)
+        moved = []
+        with transaction.atomic(using=shard):
+            for post in batch:
+                new = renamed.get(post.image.name)
+                # Пост могли отредактировать после чтения пачки.
+                if new and Post.objects.using(shard).filter(
+                    pk=post.pk, image=post.image.name
+                ).update(image=new):
+                    moved.append(post)
+        for post in moved:
+            bump_media_refs(renamed[post.image.name], 1)
+            bump_media_refs(post.image.name, -1)
+        self.totals['posts'] += len(batch)
+        self.totals['moved'] += len(moved)
+        invalidate(*{tag for post in moved for tag in post_tags(post)})
+        referenced = self._referenced(renamed)
+        for old in renamed:
+            # Пост, отредактированный во время переноса, оставит файл
+            # на месте; его уберёт collect_media.
+            if old not in referenced:
+                self.storage.delete(old)
+                MediaFile.objects.filter(name=old, refs__lte=0).delete()
+                self.totals['removed'] += 1
+
+    @staticmethod
+    def _referenced(names):
+        """Старые имена из пачки, на которые ещё ссылаются посты.
+
+        Один запрос по индексу image на шард, память — на пачку, а не на
+        все посты. Новых ссылок на старые имена не бывает: загрузки
+        получают имена по содержимому.
+        """
+        referenced = set()
+        for shard in settings.POST_SHARDS:
+            referenced.update(
+                Post.objects.using(shard).filter(image__in=list(names))
+                .order_by().values_list('image', flat=True).distinct()
+            )
+        return referenced
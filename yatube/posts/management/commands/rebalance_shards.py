@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from posts.models import AuthorShard, Post, User
+from posts.sharding import is_sharded, move_author, shard_for_author
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит посты автора и комментарии к ним на другой шард. Чтение '
+        'не останавливается, запись автора закрыта только на время '
+        'паузы --grace и догона. Без --author показывает, сколько '
+        'постов на каждом шарде.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--author', help='username автора')
+        parser.add_argument('--to', help='шард из POST_SHARDS')
+        parser.add_argument(
+            '--grace', type=float,
+            help='пауза после каждой смены карты, секунд; '
+                 'по умолчанию SHARD_MAP_TIMEOUT + 1',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if not is_sharded():
+            raise CommandError('В POST_SHARDS один шард.')
+        if options['author'] is None:
+            for shard in settings.POST_SHARDS:
+                authors = AuthorShard.objects.using(DEFAULT_DB_ALIAS).filter(
+                    shard=shard
+                ).count()
+                posts = Post.objects.using(shard).count()
+                self.stdout.write(
+                    f'{shard}: авторов в карте {authors}, постов {posts}'
+                )
+            return
+        if options['to'] not in settings.POST_SHARDS:
+            raise CommandError(f'Шарда {options["to"]!r} нет в POST_SHARDS.')
+        author = User.objects.filter(username=options['author']).first()
+        if author is None:
+            raise CommandError(f'Автор {options["author"]!r} не найден.')
+        source = shard_for_author(author.pk)
+        if source == options['to']:
+            self.stdout.write(f'{author.username} уже на {source}.')
+            return
+        move_author(
+            author.pk, options['to'], grace=options['grace'],
+            batch_size=options['batch_size'], log=self.stdout.write,
+        )
+        self.stdout.write(
+            f'{author.username}: {source} -> {options["to"]} готово.'
+        )
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts.search import (
+    ensure_search_triggers, rebuild_search_index, search_available
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает полнотекстовый индекс постов и его триггеры '
+        'на каждом шарде постов.'
+    )
+
+    def handle(self, *args, **options):
+        for shard in settings.POST_SHARDS:
+            connection = connections[shard]
+            if not search_available(connection):
+                raise CommandError(
+                    f'{shard}: полнотекстовый индекс доступен только на '
+                    'SQLite с FTS5; выполните migrate.'
+                )
+            ensure_search_triggers(connection)
+            rebuild_search_index(connection)
+            self.stdout.write(f'{shard}: индекс поиска перестроен.')
@@ -0,0 +1,113 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts.models import AuthorStats, Comment, Follow, Post, User
+
+
+def _counts(queryset, key, ids):
+    rows = queryset.filter(**{f'{key}__in': ids}).order_by().values(
+        key
+    ).annotate(count=Count('pk')).values_list(key, 'count')
+    return dict(rows)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет и сверяет денормализованные счётчики пачками. '
+        'Прерванный прогон продолжается с --start-after.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--start-after', type=int, default=0,
+            help='pk, после которого продолжить (из последнего checkpoint)',
+        )
+        parser.add_argument(
+            '--only', choices=('users', 'posts'),
+            help='сверить только счётчики пользователей или постов',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        start_after = options['start_after']
+        if options['only'] != 'posts':
+            fixed = self._walk(
+                User.objects.all(), batch_size, start_after,
+                self._reconcile_users, 'users',
+            )
+            self.stdout.write(f'users: исправлено {fixed}')
+            # Следующая таблица всегда проходится с начала.
+            start_after = 0
+        if options['only'] != 'users':
+            for shard in settings.POST_SHARDS:
+                fixed = self._walk(
+                    Post.objects.using(shard), batch_size, start_after,
+                    self._reconcile_posts, f'posts@{shard}',
+                )
+                self.stdout.write(f'posts@{shard}: исправлено {fixed}')
+
+    def _walk(self, queryset, batch_size, start_after, reconcile, label):
+        fixed = 0
+        last_pk = start_after
+        while True:
+            ids = list(
+                queryset.filter(pk__gt=last_pk).order_by('pk').values_list(
+                    'pk', flat=True
+                )[:batch_size]
+            )
+            if not ids:
+                return fixed
+            with transaction.atomic(using=queryset.db):
+                fixed += reconcile(queryset, ids)
+            last_pk = ids[-1]
+            self.stdout.write(f'{label} checkpoint: {last_pk}')
+
+    def _reconcile_users(self, queryset, ids):
+        # Посты автора лежат на одном шарде, но карта могла смениться
+        # во время прогона: суммируются все шарды.
+        posts = Counter()
+        for shard in settings.POST_SHARDS:
+            posts.update(_counts(Post.objects.using(shard), 'author_id', ids))
+        followers = _counts(Follow.objects.all(), 'author_id', ids)
+        following = _counts(Follow.objects.all(), 'user_id', ids)
+        existing = AuthorStats.objects.select_for_update().in_bulk(ids)
+        to_create, to_update = [], []
+        for user_id in ids:
+            actual = {
+                'posts_count': posts.get(user_id, 0),
+                'followers_count': followers.get(user_id, 0),
+                'following_count': following.get(user_id, 0),
+            }
+            stats = existing.get(user_id)
+            if stats is None:
+                to_create.append(AuthorStats(user_id=user_id, **actual))
+                continue
+            if any(getattr(stats, f) != v for f, v in actual.items()):
+                for field, value in actual.items():
+                    setattr(stats, field, value)
+                to_update.append(stats)
+        AuthorStats.objects.bulk_create(to_create, ignore_conflicts=True)
+        AuthorStats.objects.bulk_update(
+            to_update,
+            ['posts_count', 'followers_count', 'following_count'],
+        )
+        return len(to_create) + len(to_update)
+
+    def _reconcile_posts(self, queryset, ids):
+        comments = _counts(Comment.objects.using(queryset.db), 'post_id', ids)
+        to_update = []
+        posts = queryset.select_for_update().filter(pk__in=ids).only(
+            'pk', 'comments_count'
+        )
+        for post in posts:
+            actual = comments.get(post.pk, 0)
+            if post.comments_count != actual:
+                post.comments_count = actual
+                to_update.append(post)
+        queryset.bulk_update(to_update, ['comments_count'])
+        return len(to_update)
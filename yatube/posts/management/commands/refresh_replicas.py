@@ -0,0 +1,61 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from posts.routers import META_TABLE
+
+
+def refresh_replica(alias):
+    """Копирует основную базу в реплику через SQLite backup API и
+    отмечает в реплике, на какой момент она актуальна."""
+    source = connections[DEFAULT_DB_ALIAS]
+    source.ensure_connection()
+    synced_at = time.time()
+    target = sqlite3.connect(
+        connections.databases[alias]['NAME'],
+        timeout=settings.SQLITE_PRAGMAS.get('busy_timeout', 5000) / 1000,
+    )
+    try:
+        source.connection.backup(target)
+        target.execute(
+            f'CREATE TABLE IF NOT EXISTS {META_TABLE} (synced_at REAL)'
+        )
+        target.execute(f'DELETE FROM {META_TABLE}')
+        target.execute(
+            f'INSERT INTO {META_TABLE} (synced_at) VALUES (?)', (synced_at,)
+        )
+        target.commit()
+    finally:
+        target.close()
+    return synced_at
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновляет реплики из DATABASE_REPLICAS копией основной базы. '
+        'С --interval повторяет обновление в цикле.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='секунд между обновлениями; без него — одно обновление',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('DATABASE_REPLICAS пуст.')
+        while True:
+            for alias in settings.DATABASE_REPLICAS:
+                started = time.perf_counter()
+                refresh_replica(alias)
+                self.stdout.write(
+                    f'{alias}: обновлена за '
+                    f'{(time.perf_counter() - started) * 1000:.0f} ms'
+                )
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,167 @@
+"""Отдача MEDIA_ROOT без копирования в Python.
+
+FileResponse получает открытый файл: сервер с wsgi.file_wrapper
+(gunicorn, uWSGI) отправляет его через sendfile прямо из page cache.
+Для диапазона (Range) файл заранее сдвинут на начало куска, а длина
+задана Content-Length — sendfile сервера берёт смещение и длину оттуда
+же. Картинки, названные по содержимому (posts.storage), кешируются
+навсегда; остальные — на MEDIA_MAX_AGE с ETag и Last-Modified.
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse, HttpResponse, HttpResponseNotAllowed, HttpResponseNotFound,
+)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from .storage import CONTENT_NAME, is_content_name
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+RANGE = re.compile(r'bytes=(\d*)-(\d*)')
+BLOCK_SIZE = 64 * 1024
+
+
+class FileRange:
+    """Кусок файла для FileResponse.
+
+    read() не выходит за конец диапазона (серверы без sendfile читают
+    до пустого ответа), fileno() открывает sendfile.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def file_etag(st):
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def find_file(root, path):
+    """(полный путь, stat) обычного файла под root или None."""
+    if any(part.startswith('.') for part in path.split('/')):
+        return None
+    try:
+        fullpath = safe_join(root, path)
+        st = os.stat(fullpath)
+    except (SuspiciousFileOperation, OSError):
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return fullpath, st
+
+
+def _byte_range(request, etag, last_modified, size):
+    """(start, end) включительно; None — весь файл; False — 416."""
+    match = RANGE.fullmatch(request.META.get('HTTP_RANGE', '').strip())
+    if match is None or size == 0:
+        # Несколько диапазонов отдаются целым файлом: это допустимо.
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and (
+        parse_http_date_safe(if_range) != last_modified
+    ):
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        suffix = int(last)
+        return (size - min(suffix, size), size - 1) if suffix else False
+    start, end = int(first), int(last) if last else size - 1
+    if start >= size:
+        return False
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def serve(request, path):
+    """Файл из MEDIA_ROOT: 200, 206, 304 или 416.
+
+    404 — простой ответ без шаблона: до view не доходят сессии и
+    пользователь, которых ждёт страница ошибки.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    content_type, _ = mimetypes.guess_type(path)
+    # Только картинки: рядом лежат KV store превью и служебные каталоги.
+    found = find_file(settings.MEDIA_ROOT, path)
+    if found is None or not (content_type or '').startswith('image/'):
+        return HttpResponseNotFound()
+    fullpath, st = found
+    if is_content_name(path):
+        digest = CONTENT_NAME.fullmatch(path).group(1)
+        return serve_file(
+            request, fullpath, st, content_type, f'"{digest}"', IMMUTABLE
+        )
+    return serve_file(
+        request, fullpath, st, content_type, file_etag(st),
+        f'public, max-age={settings.MEDIA_MAX_AGE}',
+    )
+
+
+def serve_file(request, fullpath, st, content_type, etag, cache_control,
+               headers=()):
+    """Ответ на GET или HEAD файла с валидаторами и Range."""
+    last_modified = int(st.st_mtime)
+    headers = {
+        **dict(headers),
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': cache_control,
+        'Accept-Ranges': 'bytes',
+    }
+    response = get_conditional_response(request, etag, last_modified)
+    if response is None:
+        response = _file_response(
+            request, fullpath, content_type, st.st_size,
+            _byte_range(request, etag, last_modified, st.st_size),
+        )
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def _file_response(request, fullpath, content_type, size, byte_range):
+    if byte_range is False:
+        response = HttpResponse(status=416, content_type=content_type)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+    else:
+        file = open(fullpath, 'rb')
+        file.seek(start)
+        response = FileResponse(
+            FileRange(file, length), content_type=content_type
+        )
+        response.block_size = BLOCK_SIZE
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = length
+    return response
@@ -0,0 +1,204 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .cache import tag_versions
+from . import staticfiles
+from .media import serve
+from .sharding import AuthorMoving
+from .routers import (
+    replica_cache_timeout, start_request, used_replica, wrote_to_primary,
+)
+
+METRICS = ('hits', 'misses', 'purges')
+
+
+def page_cache_metrics():
+    keys = [f'pagecache:{name}' for name in METRICS]
+    values = cache.get_many(keys)
+    return {
+        name: values.get(key, 0) for name, key in zip(METRICS, keys)
+    }
+
+
+def _count(name):
+    key = f'pagecache:{name}'
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+class MediaMiddleware:
+    """Отдаёт файлы MEDIA_URL (posts.media.serve).
+
+    Стоит первым: картинкам не нужны сессии, CSRF и URL-резолвер.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        prefix = settings.MEDIA_URL
+        if prefix.startswith('/') and request.path_info.startswith(prefix):
+            return serve(request, request.path_info[len(prefix):])
+        return self.get_response(request)
+
+
+class StaticMiddleware:
+    """Отдаёт собранную статику из STATIC_ROOT (posts.staticfiles).
+
+    Файла нет в STATIC_ROOT (collectstatic не запускался) — запрос идёт
+    дальше, в runserver его отдаст django.contrib.staticfiles.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        prefix = settings.STATIC_URL
+        if (
+            settings.STATIC_ROOT and prefix.startswith('/')
+            and request.path_info.startswith(prefix)
+        ):
+            response = staticfiles.serve(
+                request, request.path_info[len(prefix):]
+            )
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+
+class PageCacheMiddleware:
+    """Кеш целых страниц для анонимных читателей.
+
+    Стоит первым в MIDDLEWARE: попадание отдаёт сохранённые байты до
+    сессий, контекст-процессоров и URL-резолвера. Кешируются только
+    ответы, которые view пометила тегами через add_page_tags; запись
+    устаревает, как только версия любого её тега меняется.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self._is_cacheable_request(request):
+            return self.get_response(request)
+        key = 'page:' + hashlib.md5(
+            request.get_full_path().encode()
+        ).hexdigest()
+        entry = cache.get(key)
+        if entry is not None:
+            tags = list(entry['tags'])
+            if tag_versions(tags) == [entry['tags'][tag] for tag in tags]:
+                _count('hits')
+                return self._build_response(entry, 'HIT')
+            cache.delete(key)
+            _count('purges')
+        response = self.get_response(request)
+        tags = getattr(request, 'page_cache_tags', None)
+        if tags and self._is_cacheable_response(response):
+            _count('misses')
+            cache.set(key, {
+                'tags': tags,
+                'status': response.status_code,
+                'headers': list(response.items()),
+                'content': response.content,
+            }, replica_cache_timeout(
+                settings.PAGE_CACHE_TIMEOUT,
+                getattr(response, 'used_replica', False),
+            ))
+            response['X-Page-Cache'] = 'MISS'
+            response['Surrogate-Key'] = ' '.join(tags)
+        return response
+
+    @staticmethod
+    def _is_cacheable_request(request):
+        return (
+            settings.PAGE_CACHE_ENABLED
+            and request.method in ('GET', 'HEAD')
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        )
+
+    @staticmethod
+    def _is_cacheable_response(response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+        )
+
+    @staticmethod
+    def _build_response(entry, state):
+        response = HttpResponse(entry['content'], status=entry['status'])
+        for header, value in entry['headers']:
+            response[header] = value
+        response['X-Page-Cache'] = state
+        response['Surrogate-Key'] = ' '.join(entry['tags'])
+        return response
+
+
+class ReplicaPinMiddleware:
+    """Привязывает запросы, меняющие данные, к основной базе.
+
+    После записи клиент получает cookie со временем записи: пока она
+    жива, его чтения идут только на реплики, скопированные позже, или
+    на основную базу (posts.routers). Без DATABASE_REPLICAS ничего не
+    делает.
+    """
+
+    cookie_name = 'primary_pin'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        try:
+            last_write = float(request.COOKIES.get(self.cookie_name, 0))
+        except ValueError:
+            last_write = 0
+        start_request(
+            pinned=request.method not in ('GET', 'HEAD', 'OPTIONS'),
+            last_write=last_write,
+        )
+        response = self.get_response(request)
+        # Состояние потока сбрасывается ниже, а PageCacheMiddleware
+        # выбирает срок кеша уже после: отметка едет на ответе.
+        response.used_replica = used_replica()
+        if wrote_to_primary():
+            response.set_cookie(
+                self.cookie_name,
+                str(time.time()),
+                max_age=settings.REPLICA_MAX_LAG,
+                httponly=True,
+            )
+        start_request()
+        return response
+
+
+class AuthorMovingMiddleware:
+    """Запись автора, чьи посты переезжают (posts.sharding.move_author),
+    получает 503 с Retry-After, а не ошибку сервера."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, AuthorMoving):
+            return None
+        response = HttpResponse(
+            'Посты автора переезжают на другой сервер. '
+            'Повторите через несколько секунд.',
+            status=503, content_type='text/plain; charset=utf-8',
+        )
+        response['Retry-After'] = settings.SHARD_MAP_TIMEOUT + 1
+        return response
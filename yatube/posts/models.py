@@ -1,9 +1,21 @@
-from django.db import models
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, models
 from django.contrib.auth import get_user_model
 
+from .storage import post_image_storage
+
 User = get_user_model()
 
 
+def holds_users(alias):
+    """В базе есть пользователи и группы: основная база и её реплики.
+
+    На остальных шардах постов (POST_SHARDS) их нет, и join с ними
+    заменяется отдельным запросом в основную базу.
+    """
+    return alias == DEFAULT_DB_ALIAS or alias not in settings.POST_SHARDS
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
@@ -13,32 +25,83 @@ class Group(models.Model):
         return self.title
 
 
+class RelatedQuerySet(models.QuerySet):
+
+    def create(self, **kwargs):
+        # Без явного using() база выбирается по самому объекту: роутер
+        # шардов видит автора поста (QuerySet.create передаёт save()
+        # базу, выбранную без объекта).
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True, using=self._db)
+        return obj
+
+    def with_related(self, *fields):
+        """select_related, а на шарде без пользователей — prefetch_related."""
+        if holds_users(self.db):
+            return self.select_related(*fields)
+        return self.prefetch_related(*fields)
+
+
+class PostQuerySet(RelatedQuerySet):
+
+    def feed(self):
+        """Посты для карточек ленты: автор, его счётчики и группа."""
+        return self.with_related('author', 'author__stats', 'group')
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
+    # Пост может лежать на шарде без таблиц пользователей и групп,
+    # поэтому связи с ними не ограничены внешним ключом в базе.
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='author_posts',
+        db_constraint=False,
     )
     group = models.ForeignKey(
         Group,
         on_delete=models.SET_NULL,
         blank=True,
         null=True,
-        related_name='group_posts'
+        related_name='group_posts',
+        db_constraint=False,
     )
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=post_image_storage,
+        blank=True,
+        # Поиск постов по картинке: превью, migrate_media, collect_media
+        db_index=True,
     )
+    comments_count = models.IntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self) -> str:
         return self.text[:15]
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            # ключ keyset-пагинации ленты: (pub_date, id)
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_id_idx',
+            ),
+            # лента профиля и группы: фильтр + тот же порядок
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
 
 class Comment(models.Model):
@@ -53,8 +116,37 @@ class Comment(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='comments',
+        db_constraint=False,
     )
 
+    objects = RelatedQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('created', 'id')
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx',
+            ),
+        ]
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Обновляются F-выражениями из сигналов, сверяются командой
+    recount_stats.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.IntegerField(default=0)
+    followers_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -67,3 +159,98 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following',
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow',
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: строка на пару (читатель, пост).
+
+    Заполняется при публикации поста (fan-out on write), дополняется при
+    подписке и очищается при отписке, поэтому follow_index читает ленту
+    одним индексным диапазоном по (user, pub_date).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        db_constraint=False,
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx',
+            ),
+        ]
+
+
+class AuthorShard(models.Model):
+    """Карта шардов: в какой базе из POST_SHARDS лежат посты автора.
+
+    Строка появляется с первым постом автора и меняется командой
+    rebalance_shards. Хранится в основной базе. moving — посты автора
+    переезжают, запись закрыта.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+    )
+    shard = models.CharField(max_length=100)
+    moving = models.BooleanField(default=False)
+
+
+class PostLocator(models.Model):
+    """Глобальный индекс постов: id поста и его автор.
+
+    По нему post_detail находит шард поста одним запросом. На нескольких
+    шардах он же выдаёт id новым постам, чтобы они не совпадали между
+    базами. Хранится в основной базе.
+    """
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+
+
+class MediaFile(models.Model):
+    """Файл картинки и число постов, которые на него ссылаются.
+
+    Одинаковые картинки лежат в posts.storage одним файлом. Счётчик
+    сдвигается из сигналов поста; файл с нулём ссылок удаляет сборщик
+    мусора. Хранится в основной базе.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    refs = models.IntegerField(default=0)
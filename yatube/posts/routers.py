@@ -0,0 +1,98 @@
+"""Маршрутизация чтений на реплики только для чтения.
+
+Реплики — копии основной базы, которые обновляет refresh_replicas.
+Копия хранит в таблице replica_meta время, на которое она актуальна.
+Чтение уходит на реплику, только если она отстаёт не больше чем на
+REPLICA_MAX_LAG секунд и не старше последней записи этого клиента.
+Записи и запросы, изменяющие данные, всегда работают с основной базой.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+META_TABLE = 'replica_meta'
+
+# Как часто процесс перечитывает replica_meta каждой реплики, секунд.
+LAG_CHECK_INTERVAL = 1
+
+_local = threading.local()
+_synced = {}
+
+
+def start_request(pinned=False, last_write=0):
+    """Состояние маршрутизации на один запрос (ReplicaPinMiddleware)."""
+    _local.pinned = pinned
+    _local.last_write = last_write
+    _local.used_replica = False
+
+
+def wrote_to_primary():
+    return getattr(_local, 'pinned', False)
+
+
+def used_replica():
+    return getattr(_local, 'used_replica', False)
+
+
+def replica_cache_timeout(timeout, replica=None):
+    """Срок кеша для данных запроса: прочитанное с реплики могло
+    отставать, поэтому живёт не дольше REPLICA_MAX_LAG.
+
+    replica — читал ли запрос реплику, если это известно не из
+    состояния потока (после ReplicaPinMiddleware оно уже сброшено).
+    """
+    if replica is None:
+        replica = used_replica()
+    if replica:
+        return min(timeout, settings.REPLICA_MAX_LAG)
+    return timeout
+
+
+def replica_synced_at(alias):
+    """Время, на которое актуальна реплика, или None."""
+    checked_at, synced_at = _synced.get(alias, (None, None))
+    now = time.monotonic()
+    if checked_at is None or now - checked_at >= LAG_CHECK_INTERVAL:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute(f'SELECT synced_at FROM {META_TABLE}')
+                row = cursor.fetchone()
+            synced_at = row and row[0]
+        except DatabaseError:
+            synced_at = None
+        _synced[alias] = (now, synced_at)
+    return synced_at
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or wrote_to_primary():
+            return DEFAULT_DB_ALIAS
+        fresh_since = max(
+            time.time() - settings.REPLICA_MAX_LAG,
+            getattr(_local, 'last_write', 0),
+        )
+        replicas = [
+            alias for alias in settings.DATABASE_REPLICAS
+            if (replica_synced_at(alias) or 0) >= fresh_since
+        ]
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        _local.used_replica = True
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Остаток запроса читает то, что только что записал.
+        if settings.DATABASE_REPLICAS:
+            _local.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
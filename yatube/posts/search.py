@@ -0,0 +1,193 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Индекс posts_post_fts — внешнее содержимое (content='posts_post'):
+текст хранится только в posts_post, а FTS5 держит инвертированный
+индекс. Синхронизацию выполняют триггеры на posts_post, поэтому в индекс
+попадают и массовые update()/delete() в обход сигналов.
+"""
+import base64
+import binascii
+import heapq
+import itertools
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+from .models import Post
+from .sharding import scatter_posts, shard_for_author
+
+FTS_TABLE = 'posts_post_fts'
+
+# Маркеры подсветки из приватной области: их нет в тексте постов,
+# поэтому их можно безопасно заменить на <mark> после экранирования.
+MARK_START = '\ue000'
+MARK_END = '\ue001'
+
+TRIGGERS_SQL = (
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai
+        AFTER INSERT ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad
+        AFTER DELETE ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+        AFTER UPDATE OF text ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END''',
+)
+
+
+def search_available(using=connection):
+    if using.vendor != 'sqlite':
+        return False
+    return FTS_TABLE in using.introspection.table_names()
+
+
+def ensure_search_triggers(using=connection):
+    """Создаёт триггеры, если их нет.
+
+    SQLite теряет триггеры, когда миграция пересоздаёт posts_post,
+    поэтому функция вызывается после каждого migrate.
+    """
+    if not search_available(using):
+        return
+    with using.cursor() as cursor:
+        for sql in TRIGGERS_SQL:
+            cursor.execute(sql)
+
+
+def rebuild_search_index(using=connection):
+    with using.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+        )
+
+
+def fts_query(query):
+    """Запрос пользователя как набор фраз FTS5 без операторов."""
+    terms = [term.replace('"', '""') for term in query.split()]
+    return ' '.join(f'"{term}"' for term in terms if term.strip('"'))
+
+
+def encode_search_cursor(rank, pk):
+    raw = f'{rank!r}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_search_cursor(token):
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        rank, pk = base64.urlsafe_b64decode(
+            padded.encode()
+        ).decode().rsplit('|', 1)
+        return float(rank), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def highlight(snippet):
+    return escape(snippet).replace(MARK_START, '<mark>').replace(
+        MARK_END, '</mark>'
+    )
+
+
+def _search_shard(using, match, group, author, after, limit):
+    """Строки (score, id, snippet) одного шарда по возрастанию score."""
+    filters, params = ['posts_post_fts MATCH %s'], [match]
+    if group is not None:
+        filters.append('p.group_id = %s')
+        params.append(group.pk)
+    if author is not None:
+        filters.append('p.author_id = %s')
+        params.append(author.pk)
+    outer = ''
+    if after is not None:
+        outer = 'WHERE score > %s OR (score = %s AND id > %s)'
+        params += [after[0], after[0], after[1]]
+    sql = f'''
+        SELECT score, id, snip FROM (
+            SELECT p.id AS id,
+                   bm25({FTS_TABLE}) AS score,
+                   snippet({FTS_TABLE}, 0, %s, %s, '…', 16) AS snip
+            FROM {FTS_TABLE}
+            JOIN posts_post p ON p.id = {FTS_TABLE}.rowid
+            WHERE {' AND '.join(filters)}
+        ) {outer}
+        ORDER BY score, id
+        LIMIT %s
+    '''
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, [MARK_START, MARK_END] + params + [limit])
+        return [(score, pk, snip, using) for score, pk, snip in cursor]
+
+
+def search_posts(query, count, group=None, author=None, after=None):
+    """Посты по релевантности BM25 с подсветкой и keyset-пагинацией.
+
+    Возвращает (посты, курсор следующей страницы или None). У каждого
+    поста заполнены snippet (безопасный HTML) и rank. Поиск идёт по всем
+    шардам постов (по шарду автора, если он задан), результаты
+    сливаются по (score, id).
+    """
+    match = fts_query(query)
+    if not match:
+        return [], None
+    if author is not None:
+        shards = [shard_for_author(author.pk)]
+    else:
+        shards = settings.POST_SHARDS
+    if not all(search_available(connections[shard]) for shard in shards):
+        return _like_search(query, count, group, author)
+    rows = list(itertools.islice(heapq.merge(*(
+        _search_shard(shard, match, group, author, after, count + 1)
+        for shard in shards
+    )), count + 1))
+    posts = {}
+    for shard in shards:
+        ids = [row[1] for row in rows[:count] if row[3] == shard]
+        if ids:
+            posts.update(Post.objects.using(shard).feed().in_bulk(ids))
+    results = []
+    for rank, pk, snip, _ in rows[:count]:
+        post = posts.get(pk)
+        if post is None:
+            continue
+        post.rank = rank
+        post.snippet = highlight(snip)
+        results.append(post)
+    next_cursor = None
+    if len(rows) > count:
+        rank, pk = rows[count - 1][:2]
+        next_cursor = encode_search_cursor(rank, pk)
+    return results, next_cursor
+
+
+def _like_search(query, count, group, author):
+    """Запасной путь без FTS5: LIKE по тексту, свежие сначала."""
+    filters = {'text__icontains': query}
+    if group is not None:
+        filters['group'] = group
+    if author is not None:
+        filters['author'] = author
+    results = list(scatter_posts(**filters)[:count])
+    for post in results:
+        post.rank = None
+        post.snippet = escape(post.text[:200])
+    return results, None
+
+
+def matching_posts_filter(query):
+    """Условие для queryset: pk из полнотекстового индекса."""
+    return {'pk__in': RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        [fts_query(query)],
+    )}
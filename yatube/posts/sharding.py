@@ -0,0 +1,378 @@
+"""Шардирование постов и комментариев по автору.
+
+Посты автора и комментарии к ним лежат в одной базе из POST_SHARDS,
+её называет карта AuthorShard. Пользователи, группы, подписки,
+счётчики и ленты подписок остаются в основной базе. profile и
+post_detail читают один шард, index и group_list собирают страницу со
+всех шардов и сливают по (pub_date, id).
+
+Первым в POST_SHARDS идёт 'default': там лежат посты авторов, которых
+ещё нет в карте.
+"""
+import heapq
+import itertools
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import prefetch_related_objects
+
+from .cache import invalidate
+from .models import AuthorShard, Comment, Post, PostLocator, User
+
+FEED_RELATIONS = ('author', 'author__stats', 'group')
+
+POST_FIELDS = ('text', 'pub_date', 'group', 'image', 'comments_count')
+
+
+def is_sharded():
+    return len(settings.POST_SHARDS) > 1
+
+
+class AuthorMoving(Exception):
+    """Посты автора переезжают на другой шард (move_author): запись
+    временно закрыта."""
+
+
+def _map_key(author_id):
+    return f'shard:map:{author_id}'
+
+
+def _author_map(author_id):
+    """(шард, moving) из карты; процесс помнит их SHARD_MAP_TIMEOUT."""
+    key = _map_key(author_id)
+    entry = cache.get(key)
+    if entry is None:
+        entry = AuthorShard.objects.using(DEFAULT_DB_ALIAS).filter(
+            user_id=author_id
+        ).values_list('shard', 'moving').first()
+        entry = entry or (settings.POST_SHARDS[0], False)
+        cache.set(key, entry, settings.SHARD_MAP_TIMEOUT)
+    return entry
+
+
+def _set_map(author_id, shard, moving):
+    AuthorShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+        user_id=author_id, defaults={'shard': shard, 'moving': moving}
+    )
+    cache.set(
+        _map_key(author_id), (shard, moving), settings.SHARD_MAP_TIMEOUT
+    )
+
+
+def shard_for_author(author_id):
+    """Шард с постами автора."""
+    if not is_sharded():
+        return settings.POST_SHARDS[0]
+    return _author_map(author_id)[0]
+
+
+def check_writable(author_id):
+    """AuthorMoving, если посты автора сейчас переезжают."""
+    if is_sharded() and author_id is not None and _author_map(author_id)[1]:
+        raise AuthorMoving(author_id)
+
+
+def assign_shard(author_id):
+    """Шард для нового поста; первый пост закрепляет автора в карте.
+
+    Новые авторы распределяются по id, а авторы с постами в 'default'
+    остаются там.
+    """
+    if not is_sharded():
+        return settings.POST_SHARDS[0]
+    mapping = AuthorShard.objects.using(DEFAULT_DB_ALIAS)
+    shard = mapping.filter(user_id=author_id).values_list(
+        'shard', flat=True
+    ).first()
+    if shard is None:
+        legacy = settings.POST_SHARDS[0]
+        if Post.objects.using(legacy).filter(author_id=author_id).exists():
+            shard = legacy
+        else:
+            shard = settings.POST_SHARDS[
+                author_id % len(settings.POST_SHARDS)
+            ]
+        shard = mapping.get_or_create(
+            user_id=author_id, defaults={'shard': shard}
+        )[0].shard
+        cache.delete(_map_key(author_id))
+    return shard
+
+
+def allocate_post_id(author_id):
+    """Глобальный id нового поста из PostLocator."""
+    return PostLocator.objects.using(DEFAULT_DB_ALIAS).create(
+        author_id=author_id
+    ).pk
+
+
+def post_author(post_id):
+    """Автор поста по PostLocator или None."""
+    return PostLocator.objects.using(DEFAULT_DB_ALIAS).filter(
+        pk=post_id
+    ).values_list('author_id', flat=True).first()
+
+
+def locate_post(post_id):
+    """Шард поста или None, если поста нет."""
+    if not is_sharded():
+        return settings.POST_SHARDS[0]
+    author_id = post_author(post_id)
+    if author_id is not None:
+        return shard_for_author(author_id)
+    # Пост, созданный в обход save() (bulk_create): ищем по всем шардам.
+    for shard in settings.POST_SHARDS:
+        if Post.objects.using(shard).filter(pk=post_id).exists():
+            return shard
+    return None
+
+
+def post_queryset(post_id):
+    """Посты на шарде поста post_id."""
+    if not is_sharded():
+        return Post.objects.all()
+    shard = locate_post(post_id)
+    if shard is None:
+        return Post.objects.none()
+    return Post.objects.using(shard)
+
+
+class ShardedFeed:
+    """Посты со всех шардов, слитые в одном порядке.
+
+    Поддерживает то, что нужно Paginator и CursorPaginator: count(),
+    срезы, filter() и order_by(). Срез [a:b] читает с каждого шарда не
+    больше b строк, связи подгружаются уже для слитой страницы.
+    """
+    ordered = True
+
+    def __init__(self, querysets, ordering=('-pub_date', '-pk'),
+                 relations=FEED_RELATIONS):
+        self.querysets = [qs.order_by(*ordering) for qs in querysets]
+        self.ordering = ordering
+        self.relations = relations
+
+    def _clone(self, querysets, ordering=None):
+        return ShardedFeed(
+            querysets, ordering or self.ordering, self.relations
+        )
+
+    def filter(self, *args, **kwargs):
+        return self._clone([qs.filter(*args, **kwargs)
+                            for qs in self.querysets])
+
+    def order_by(self, *fields):
+        return self._clone(self.querysets, fields)
+
+    def count(self):
+        return sum(qs.count() for qs in self.querysets)
+
+    def _sort_key(self, post):
+        return tuple(
+            getattr(post, field.lstrip('-')) for field in self.ordering
+        )
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start, stop = key.start or 0, key.stop
+        rows = heapq.merge(
+            *(list(qs[:stop]) for qs in self.querysets),
+            key=self._sort_key,
+            reverse=self.ordering[0].startswith('-'),
+        )
+        page = list(itertools.islice(rows, start, stop))
+        prefetch_related_objects(page, *self.relations)
+        return page
+
+
+def scatter_posts(**filters):
+    """Лента постов по фильтру со всех шардов."""
+    if not is_sharded():
+        return Post.objects.filter(**filters).feed()
+    return ShardedFeed([
+        Post.objects.using(shard).filter(**filters)
+        for shard in settings.POST_SHARDS
+    ])
+
+
+def timeline_posts(entries):
+    """Посты для записей ленты подписок, каждый со своего шарда."""
+    if not is_sharded():
+        return [entry.post for entry in entries]
+    by_shard = {}
+    for entry in entries:
+        shard = shard_for_author(entry.author_id)
+        by_shard.setdefault(shard, []).append(entry.post_id)
+    posts = {}
+    for shard, ids in by_shard.items():
+        posts.update(Post.objects.using(shard).in_bulk(ids))
+    rows = [posts[entry.post_id] for entry in entries
+            if entry.post_id in posts]
+    prefetch_related_objects(rows, 'author', 'group')
+    return rows
+
+
+def _copy_posts(author_id, source, target, after, batch_size):
+    """Копирует посты автора с pk > after; возвращает последний pk."""
+    while True:
+        batch = list(Post.objects.using(source).filter(
+            author_id=author_id, pk__gt=after
+        ).order_by('pk')[:batch_size])
+        if not batch:
+            return after
+        Post.objects.using(target).bulk_create(batch, ignore_conflicts=True)
+        after = batch[-1].pk
+
+
+def _copy_comments(author_id, source, target, after, batch_size):
+    """Копирует комментарии к постам автора с pk > after.
+
+    В целевой базе комментарии получают новые pk: у каждого шарда своя
+    последовательность.
+    """
+    while True:
+        batch = list(Comment.objects.using(source).filter(
+            post__author_id=author_id, pk__gt=after
+        ).order_by('pk')[:batch_size])
+        if not batch:
+            return after
+        after = batch[-1].pk
+        for comment in batch:
+            comment.pk = None
+        Comment.objects.using(target).bulk_create(batch)
+
+
+def _sync_posts(author_id, source, target, batch_size):
+    """Переносит правки и удаления постов, сделанные во время копирования."""
+    current = set(Post.objects.using(source).filter(
+        author_id=author_id
+    ).values_list('pk', flat=True))
+    removed = [
+        pk for pk in Post.objects.using(target).filter(
+            author_id=author_id
+        ).values_list('pk', flat=True)
+        if pk not in current
+    ]
+    if removed:
+        _delete_posts(target, removed)
+    after = 0
+    while True:
+        batch = list(Post.objects.using(source).filter(
+            author_id=author_id, pk__gt=after
+        ).order_by('pk')[:batch_size])
+        if not batch:
+            return
+        Post.objects.using(target).bulk_update(batch, POST_FIELDS)
+        after = batch[-1].pk
+
+
+def _execute(alias, sql, params):
+    with connections[alias].cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _delete_posts(alias, ids):
+    """Удаляет копии постов и их комментарии без сигналов."""
+    marks = ', '.join(['%s'] * len(ids))
+    _execute(alias, f'DELETE FROM posts_comment WHERE post_id IN ({marks})',
+             ids)
+    _execute(alias, f'DELETE FROM posts_post WHERE id IN ({marks})', ids)
+
+
+def move_author(author_id, target, grace=None, batch_size=500,
+                log=lambda message: None):
+    """Переносит посты автора и комментарии к ним на другой шард.
+
+    Основной объём копируется пачками без остановки записи. Затем карта
+    закрывает запись автора (moving): после паузы grace, за которую
+    истекает кеш карты в других процессах, на старый шард никто не
+    пишет, и правки, удаления и новые строки, сделанные во время
+    копирования, переносятся уже окончательно. Карта переключается на
+    новый шард и снова открывает запись; ещё через grace процессы
+    перестают читать старый шард, и строки удаляются с него — напрямую
+    SQL, без сигналов: посты переехали, а не удалены.
+    """
+    if grace is None:
+        grace = settings.SHARD_MAP_TIMEOUT + 1
+    source = shard_for_author(author_id)
+    if source == target:
+        return
+    post_mark = _copy_posts(author_id, source, target, 0, batch_size)
+    comment_mark = _copy_comments(author_id, source, target, 0, batch_size)
+    log(f'скопировано: посты до {post_mark}, комментарии до {comment_mark}')
+
+    _set_map(author_id, source, moving=True)
+    log('запись автора закрыта')
+    try:
+        time.sleep(grace)
+        _sync_posts(author_id, source, target, batch_size)
+        _copy_posts(author_id, source, target, post_mark, batch_size)
+        _copy_comments(author_id, source, target, comment_mark, batch_size)
+        _execute(target, (
+            'UPDATE posts_post SET comments_count = ('
+            'SELECT COUNT(*) FROM posts_comment '
+            'WHERE posts_comment.post_id = posts_post.id) '
+            'WHERE author_id = %s'
+        ), [author_id])
+    except BaseException:
+        _set_map(author_id, source, moving=False)
+        raise
+    _set_map(author_id, target, moving=False)
+    invalidate('feed', f'author:{author_id}')
+    log(f'карта переключена на {target}')
+
+    time.sleep(grace)
+    _execute(source, (
+        'DELETE FROM posts_comment WHERE post_id IN ('
+        'SELECT id FROM posts_post WHERE author_id = %s)'
+    ), [author_id])
+    _execute(source, 'DELETE FROM posts_post WHERE author_id = %s',
+             [author_id])
+    invalidate('feed', f'author:{author_id}')
+    log(f'{source}: строки автора удалены')
+
+
+class ShardRouter:
+    """Post и Comment читаются и пишутся на шарде автора поста.
+
+    Запросы без подсказки (Post.objects.filter(...)) идут дальше по
+    цепочке роутеров: ленты по всем шардам собирают ShardedFeed и
+    scatter_posts.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not is_sharded() or model not in (Post, Comment):
+            return None
+        instance = hints.get('instance')
+        if isinstance(instance, (Post, Comment)):
+            return instance._state.db
+        if model is Post and isinstance(instance, User):
+            return shard_for_author(instance.pk)
+        return None
+
+    def db_for_write(self, model, **hints):
+        if not is_sharded() or model not in (Post, Comment):
+            return None
+        instance = hints.get('instance')
+        if isinstance(instance, Post):
+            check_writable(instance.author_id)
+            if instance.pk is None:
+                return assign_shard(instance.author_id)
+            return shard_for_author(instance.author_id)
+        if isinstance(instance, Comment):
+            if Comment._meta.get_field('post').is_cached(instance):
+                check_writable(instance.post.author_id)
+                return instance.post._state.db
+            check_writable(post_author(instance.post_id))
+            return locate_post(instance.post_id)
+        return self.db_for_read(model, **hints)
+
+    def allow_migrate(self, db, app_label, **hints):
+        # На шардах полная схема: сборщик каскадного удаления ищет
+        # связанные строки в той же базе.
+        if is_sharded() and db in settings.POST_SHARDS:
+            return True
+        return None
@@ -0,0 +1,194 @@
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from .cache import invalidate, post_tags
+from .counters import (
+    bump_author_stats, bump_comments_count, bump_media_refs,
+)
+from .models import (
+    Comment, Follow, Group, Post, PostLocator, TimelineEntry, User,
+)
+from .sharding import allocate_post_id, is_sharded, shard_for_author
+from .thumbnails import schedule_post
+from .timeline import backfill_timeline, fan_out_post, prune_timeline
+
+# Посты, которые удаляет текущий поток: их комментарии уходят каскадом,
+# и счётчик с кешем поста им трогать незачем.
+_deleting = threading.local()
+
+
+def _deleting_posts():
+    if not hasattr(_deleting, 'posts'):
+        _deleting.posts = set()
+    return _deleting.posts
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, using, **kwargs):
+    if instance.pk is None:
+        # На нескольких шардах id выдаёт общий PostLocator.
+        if is_sharded():
+            instance.pk = allocate_post_id(instance.author_id)
+        return
+    old = Post.objects.using(using).filter(pk=instance.pk).values_list(
+        'group_id', 'image', 'author_id'
+    ).first()
+    if old is None:
+        return
+    old_group_id, instance._old_image, instance._old_author_id = old
+    # При смене группы устаревает и лента прежней группы.
+    if old_group_id and old_group_id != instance.group_id:
+        invalidate(f'group:{old_group_id}')
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, using, **kwargs):
+    # Превью считаются в фоне после коммита: файл картинки уже на месте.
+    transaction.on_commit(lambda: schedule_post(instance), using=using)
+    old_image = getattr(instance, '_old_image', '')
+    if instance.image.name != old_image:
+        bump_media_refs(instance.image.name, 1)
+        bump_media_refs(old_image, -1)
+    if created:
+        if not is_sharded():
+            PostLocator.objects.using(DEFAULT_DB_ALIAS).create(
+                pk=instance.pk, author_id=instance.author_id
+            )
+        bump_author_stats(instance.author_id, 'posts_count', 1)
+        fan_out_post(instance)
+    old_author_id = getattr(instance, '_old_author_id', instance.author_id)
+    if old_author_id != instance.author_id:
+        _author_changed(instance, old_author_id)
+    invalidate(*post_tags(instance))
+
+
+def _author_changed(post, old_author_id):
+    """Пост передан другому автору (админка): счётчики, ленты
+    подписчиков и PostLocator следуют за ним."""
+    bump_author_stats(old_author_id, 'posts_count', -1)
+    bump_author_stats(post.author_id, 'posts_count', 1)
+    PostLocator.objects.using(DEFAULT_DB_ALIAS).filter(pk=post.pk).update(
+        author_id=post.author_id
+    )
+    TimelineEntry.objects.filter(post_id=post.pk).delete()
+    fan_out_post(post)
+    invalidate(f'author:{old_author_id}')
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    _deleting_posts().add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    # Комментарии каскада удалены раньше поста.
+    _deleting_posts().discard(instance.pk)
+    bump_author_stats(instance.author_id, 'posts_count', -1)
+    bump_media_refs(instance.image.name, -1)
+    PostLocator.objects.using(DEFAULT_DB_ALIAS).filter(
+        pk=instance.pk
+    ).delete()
+    if is_sharded():
+        # Записи лент в основной базе не связаны с шардом внешним ключом.
+        TimelineEntry.objects.filter(post_id=instance.pk).delete()
+    invalidate(*post_tags(instance))
+
+
+def _invalidate_comment_post(comment, using):
+    post = Post.objects.using(using).filter(pk=comment.post_id).only(
+        'author_id', 'group_id'
+    ).first()
+    if post is not None:
+        invalidate(*post_tags(post))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, using, **kwargs):
+    if created:
+        bump_comments_count(instance.post_id, 1, using)
+    _invalidate_comment_post(instance, using)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, using, **kwargs):
+    if instance.post_id in _deleting_posts():
+        return
+    bump_comments_count(instance.post_id, -1, using)
+    _invalidate_comment_post(instance, using)
+
+
+def _user_tags(user_id):
+    """Теги страниц, где выводятся имя или username пользователя:
+    ленты с его постами и посты с его комментариями."""
+    tags = {'feed', f'author:{user_id}'}
+    groups = Post.objects.using(shard_for_author(user_id)).filter(
+        author_id=user_id, group__isnull=False
+    ).order_by().values_list('group_id', flat=True).distinct()
+    tags.update(f'group:{group_id}' for group_id in groups)
+    for shard in settings.POST_SHARDS:
+        posts = Comment.objects.using(shard).filter(
+            author_id=user_id
+        ).order_by().values_list('post_id', flat=True).distinct()
+        tags.update(f'post:{post_id}' for post_id in posts)
+    return sorted(tags)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    # Вход сохраняет только last_login: на страницах его нет.
+    if created or update_fields == {'last_login'}:
+        return
+    invalidate(*_user_tags(instance.pk))
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    # Каскад Django удаляет строки только в базе пользователя.
+    if not is_sharded():
+        return
+    for shard in settings.POST_SHARDS:
+        if shard != DEFAULT_DB_ALIAS:
+            Comment.objects.using(shard).filter(author=instance).delete()
+            Post.objects.using(shard).filter(author=instance).delete()
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    if not is_sharded():
+        return
+    for shard in settings.POST_SHARDS:
+        if shard != DEFAULT_DB_ALIAS:
+            Post.objects.using(shard).filter(group=instance).update(
+                group=None
+            )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    # Название и slug группы выводятся в карточках общей ленты и профилей.
+    invalidate('feed', 'groups', f'group:{instance.pk}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        bump_author_stats(instance.author_id, 'followers_count', 1)
+        bump_author_stats(instance.user_id, 'following_count', 1)
+        backfill_timeline(instance.user_id, instance.author_id)
+    invalidate(f'author:{instance.author_id}', f'author:{instance.user_id}')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    bump_author_stats(instance.author_id, 'followers_count', -1)
+    bump_author_stats(instance.user_id, 'following_count', -1)
+    prune_timeline(instance.user_id, instance.author_id)
+    invalidate(f'author:{instance.author_id}', f'author:{instance.user_id}')
@@ -0,0 +1,244 @@
+"""Кеш Django в файле SQLite, общий для всех процессов сервера.
+
+LocMemCache у каждого воркера свой: страница и превью кешируются столько
+раз, сколько воркеров, и после выкладки каждый заново греется с нуля.
+Здесь все процессы читают и пишут один файл LOCATION в режиме WAL
+(posts.db.connect): читатели не ждут писателя, запись из другого
+процесса видна сразу.
+
+add и incr атомарны — это один оператор SQL (UPSERT и UPDATE ...
+RETURNING), а не чтение с последующей записью; incr значения, которое
+хранится не числом, читает и пишет в одной транзакции BEGIN IMMEDIATE.
+Просроченные записи не отдаются и удаляются при чистке; чистка раз в
+CULL_EVERY записей процесса оставляет не больше MAX_ENTRIES, выбрасывая
+давно не читанные записи. Время чтения обновляется не чаще раза в
+ACCESS_RESOLUTION секунд, чтобы чтение горячих ключей не превращалось в
+запись.
+"""
+import itertools
+import os
+import pickle
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .db import connect
+
+TABLE = 'django_cache'
+CULL_EVERY = 100
+ACCESS_RESOLUTION = 60
+INT64 = range(-2 ** 63, 2 ** 63)
+
+SCHEMA = (
+    f'CREATE TABLE IF NOT EXISTS {TABLE} ('
+    'key TEXT PRIMARY KEY, value NOT NULL, expires REAL, '
+    'accessed REAL NOT NULL)',
+    f'CREATE INDEX IF NOT EXISTS {TABLE}_accessed ON {TABLE} (accessed)',
+    f'CREATE INDEX IF NOT EXISTS {TABLE}_expires ON {TABLE} (expires)',
+)
+ALIVE = '(expires IS NULL OR expires > ?)'
+
+
+def _encode(value):
+    # Целые хранятся числом: incr прибавляет их прямо в SQL.
+    if type(value) is int and value in INT64:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _decode(value):
+    if isinstance(value, int):
+        return value
+    return pickle.loads(value)
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._writes = itertools.count(1)
+
+    @property
+    def connection(self):
+        """Соединение потока; после fork открывается новое."""
+        owner = os.getpid()
+        if getattr(self._local, 'owner', None) != owner:
+            self._local.owner = owner
+            self._local.connection = connection = connect(self._path)
+            for statement in SCHEMA:
+                connection.execute(statement)
+        return self._local.connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        # Конфликт с живой записью ничего не меняет: rowcount == 0.
+        cursor = self.connection.execute(
+            f'INSERT INTO {TABLE} (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires, '
+            'accessed = excluded.accessed WHERE expires <= ?',
+            (
+                self._key(key, version), _encode(value),
+                self.get_backend_timeout(timeout), now, now,
+            ),
+        )
+        self._maybe_cull()
+        return cursor.rowcount > 0
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._get_many([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        mapping = {self._key(key, version): key for key in keys}
+        return {
+            mapping[key]: value
+            for key, value in self._get_many(list(mapping)).items()
+        }
+
+    def _get_many(self, keys):
+        if not keys:
+            return {}
+        now = time.time()
+        rows = self.connection.execute(
+            f'SELECT key, value, accessed FROM {TABLE} '
+            f'WHERE key IN ({", ".join("?" * len(keys))}) AND {ALIVE}',
+            (*keys, now),
+        ).fetchall()
+        stale = [key for key, _, accessed in rows
+                 if accessed < now - ACCESS_RESOLUTION]
+        if stale:
+            self.connection.execute(
+                f'UPDATE {TABLE} SET accessed = ? '
+                f'WHERE key IN ({", ".join("?" * len(stale))})',
+                (now, *stale),
+            )
+        return {key: _decode(value) for key, value, _ in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.connection.execute(
+            *self._set_query(self._key(key, version), value, timeout)
+        )
+        self._maybe_cull()
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция с блокировкой записи с самого начала: между
+        чтением и записью внутри неё никто другой не пишет."""
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._transaction() as connection:
+            for key, value in data.items():
+                connection.execute(
+                    *self._set_query(self._key(key, version), value, timeout)
+                )
+        self._maybe_cull()
+        return []
+
+    def _set_query(self, key, value, timeout):
+        return (
+            f'INSERT INTO {TABLE} (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires, '
+            'accessed = excluded.accessed',
+            (key, _encode(value), self.get_backend_timeout(timeout),
+             time.time()),
+        )
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        cursor = self.connection.execute(
+            f'UPDATE {TABLE} SET expires = ?, accessed = ? '
+            f'WHERE key = ? AND {ALIVE}',
+            (self.get_backend_timeout(timeout), now,
+             self._key(key, version), now),
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        rows = self.connection.execute(
+            f'UPDATE {TABLE} SET value = value + ? WHERE key = ? '
+            f"AND typeof(value) = 'integer' AND {ALIVE} RETURNING value",
+            (delta, key, time.time()),
+        ).fetchall()
+        if rows:
+            return rows[0][0]
+        # Нет ключа или значение не целое (pickle): чтение и запись под
+        # одной блокировкой, срок записи прежний.
+        with self._transaction() as connection:
+            row = connection.execute(
+                f'SELECT value FROM {TABLE} WHERE key = ? AND {ALIVE}',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = _decode(row[0]) + delta
+            connection.execute(
+                f'UPDATE {TABLE} SET value = ? WHERE key = ?',
+                (_encode(value), key),
+            )
+        return value
+
+    def has_key(self, key, version=None):
+        return self.connection.execute(
+            f'SELECT 1 FROM {TABLE} WHERE key = ? AND {ALIVE}',
+            (self._key(key, version), time.time()),
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self.connection.execute(
+                f'DELETE FROM {TABLE} '
+                f'WHERE key IN ({", ".join("?" * len(keys))})',
+                keys,
+            )
+
+    def clear(self):
+        self.connection.execute(f'DELETE FROM {TABLE}')
+
+    def _maybe_cull(self):
+        if next(self._writes) % CULL_EVERY == 0:
+            self.cull()
+
+    def cull(self):
+        """Удаляет просроченные записи и давно не читанные сверх
+        MAX_ENTRIES (с запасом max_entries // cull_frequency)."""
+        connection = self.connection
+        connection.execute(
+            f'DELETE FROM {TABLE} WHERE expires <= ?', (time.time(),)
+        )
+        count, = connection.execute(
+            f'SELECT COUNT(*) FROM {TABLE}'
+        ).fetchone()
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            self.clear()
+            return
+        connection.execute(
+            f'DELETE FROM {TABLE} WHERE key IN (SELECT key FROM {TABLE} '
+            'ORDER BY accessed LIMIT ?)',
+            (count - self._max_entries
+             + self._max_entries // self._cull_frequency,),
+        )
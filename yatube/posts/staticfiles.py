@@ -0,0 +1,116 @@
+"""Статика с хешем в имени и заранее сжатыми копиями.
+
+collectstatic (CompressedManifestStorage) пишет в STATIC_ROOT имена с
+хешем содержимого и рядом с текстовыми файлами — .gz. StaticMiddleware
+отдаёт их из процесса: сжатую копию по Accept-Encoding, для имён с
+хешем — Cache-Control immutable. На запрос ничего не сжимается.
+"""
+import gzip
+import mimetypes
+import os
+import re
+import shutil
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import (
+    ManifestStaticFilesStorage, StaticFilesStorage, staticfiles_storage,
+)
+from django.http import HttpResponseNotAllowed
+
+from .media import IMMUTABLE, file_etag, find_file, serve_file
+
+COMPRESSIBLE = (
+    '.css', '.js', '.svg', '.json', '.map', '.txt', '.xml', '.html', '.ico',
+)
+# Имя от ManifestStaticFilesStorage.hashed_name: 12 знаков md5 перед
+# расширением.
+HASHED_NAME = re.compile(r'(.*)\.[0-9a-f]{12}(\.[^./]+)?')
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    # Без манифеста (collectstatic не запускался: разработка, тесты)
+    # {% static %} отдаёт имя без хеша, а не падает.
+    manifest_strict = False
+
+    def url(self, name, force=False):
+        try:
+            return super().url(name, force)
+        except ValueError:
+            return StaticFilesStorage.url(self, name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # Исходные имена тоже: с DEBUG {% static %} ссылается на них.
+        for name in sorted({*paths, *self.hashed_files.values()}):
+            if name.endswith(COMPRESSIBLE) and self._compress(name):
+                yield name, f'{name}.gz', True
+
+    def _compress(self, name):
+        """Пишет name.gz, если сжатие что-то даёт."""
+        path = self.path(name)
+        compressed = f'{path}.gz'
+        with open(path, 'rb') as source, open(compressed, 'wb') as target:
+            # mtime=0: одинаковый файл при каждом collectstatic.
+            with gzip.GzipFile(
+                filename='', mode='wb', fileobj=target, compresslevel=9,
+                mtime=0,
+            ) as archive:
+                shutil.copyfileobj(source, archive)
+        if os.path.getsize(compressed) < os.path.getsize(path):
+            return True
+        os.remove(compressed)
+        return False
+
+
+def is_hashed(path):
+    """path — имя с хешем из манифеста collectstatic."""
+    match = HASHED_NAME.fullmatch(path)
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', {})
+    return bool(match) and hashed_files.get(
+        match.group(1) + (match.group(2) or '')
+    ) == path
+
+
+def accepts_gzip(request):
+    for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = coding.partition(';')
+        if name.strip().lower() not in ('gzip', '*'):
+            continue
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def serve(request, path):
+    """Файл из STATIC_ROOT или None, если его там нет."""
+    found = find_file(settings.STATIC_ROOT, path)
+    if found is None:
+        return None
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    fullpath, st = found
+    content_type, encoding = mimetypes.guess_type(path)
+    if encoding:
+        content_type = 'application/gzip'
+    headers = {}
+    compressed = not encoding and find_file(
+        settings.STATIC_ROOT, f'{path}.gz'
+    )
+    if compressed:
+        headers['Vary'] = 'Accept-Encoding'
+        if accepts_gzip(request):
+            fullpath, st = compressed
+            headers['Content-Encoding'] = 'gzip'
+    return serve_file(
+        request, fullpath, st, content_type or 'application/octet-stream',
+        file_etag(st),
+        IMMUTABLE if is_hashed(path) else 'public, max-age=0, must-revalidate',
+        headers,
+    )
@@ -0,0 +1,87 @@
+"""Хранилище картинок постов по содержимому.
+
+Файл называется SHA-256 своих байтов и лежит в двух уровнях
+подкаталогов по префиксу хеша: posts/ab/cd/abcd….jpg. В одном каталоге
+не больше нескольких сотен файлов, а одинаковые картинки хранятся один
+раз. Сколько постов ссылается на файл, считает MediaFile
+(posts.counters.bump_media_refs); файлы без ссылок удаляет сборщик
+мусора.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Недописанные файлы; одна файловая система с MEDIA_ROOT, чтобы
+# os.replace был атомарным.
+INCOMING = '.incoming'
+CONTENT_NAME = re.compile(
+    r'(?:.*/)?[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})\.\w+'
+)
+
+
+def content_name(directory, digest, ext):
+    return '/'.join(
+        part for part in (directory, digest[:2], digest[2:4], digest + ext)
+        if part
+    )
+
+
+def is_content_name(name):
+    return bool(CONTENT_NAME.fullmatch(name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # Имя выбирает _save по содержимому: одинаковое имя — тот же файл.
+        return name
+
+    def _save(self, name, content):
+        """Пишет файл во временный, считая хеш по кускам, и переносит его
+        под именем по хешу. Если такой файл уже есть, копия удаляется."""
+        directory, ext = os.path.split(name)[0], os.path.splitext(name)[1]
+        incoming = self.path(INCOMING)
+        os.makedirs(incoming, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=incoming)
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    file.write(chunk)
+            name = content_name(directory, digest.hexdigest(), ext.lower())
+            path = self.path(name)
+            if os.path.exists(path):
+                # Свежий mtime: сборщик мусора не тронет файл, на который
+                # вот-вот сошлётся новый пост.
+                os.utime(path)
+                os.remove(temporary)
+            else:
+                self._makedirs(os.path.dirname(path))
+                os.chmod(temporary, self.file_permissions_mode or 0o644)
+                os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
+
+    def _makedirs(self, directory):
+        if self.directory_permissions_mode is None:
+            os.makedirs(directory, exist_ok=True)
+            return
+        old_umask = os.umask(0)
+        try:
+            os.makedirs(
+                directory, self.directory_permissions_mode, exist_ok=True
+            )
+        finally:
+            os.umask(old_umask)
+
+
+post_image_storage = ContentAddressedStorage()
@@ -0,0 +1,49 @@
+from django import template
+from django.conf import settings
+
+from posts.cache import post_tags
+from posts.thumbnails import (
+    DeferredThumbnailBackend, supported_formats, variants
+)
+
+register = template.Library()
+
+MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg', 'PNG': 'image/png'}
+
+
+def _srcset(thumbnails):
+    return ', '.join(
+        f'{thumbnail.url} {thumbnail.x}w' for thumbnail in thumbnails
+    )
+
+
+@register.simple_tag
+def post_picture(post):
+    """Готовые варианты картинки поста для <picture> или None.
+
+    sources — <source> для предпочтительных форматов, img и srcset —
+    для <img> в последнем формате из POST_IMAGE_FORMATS. Недостающие
+    варианты ставятся в очередь; пока их нет, шаблон показывает
+    исходную картинку.
+    """
+    backend = DeferredThumbnailBackend()
+    tags = post_tags(post)
+    ready = {}
+    for fmt, _, geometry, options in variants():
+        thumbnail = backend.get_thumbnail(
+            post.image, geometry, tags=tags, **options
+        )
+        if thumbnail:
+            ready.setdefault(fmt, []).append(thumbnail)
+    fallback = ready.pop(supported_formats()[-1], None)
+    if not fallback:
+        return None
+    card_width = settings.POST_IMAGE_SIZE[0]
+    return {
+        'sources': [
+            {'type': MIME_TYPES[fmt], 'srcset': _srcset(thumbnails)}
+            for fmt, thumbnails in ready.items()
+        ],
+        'srcset': _srcset(fallback),
+        'img': min(fallback, key=lambda image: abs(image.x - card_width)),
+    }
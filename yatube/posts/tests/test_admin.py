@@ -0,0 +1,137 @@
+import datetime
+from unittest import mock
+
+from django.contrib.admin import helpers
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.admin import EstimatedCountPaginator, IndexedDatesQuerySet
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class PostAdminTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        cls.group = Group.objects.create(
+            title='Старая группа', slug='old', description='Описание'
+        )
+        cls.new_group = Group.objects.create(
+            title='Новая группа', slug='new', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, group=cls.group, text=f'Пост {i}'
+            )
+            for i in range(5)
+        ]
+        dates = [(2020, 3, 1), (2020, 3, 2), (2020, 7, 1), (2022, 1, 5)]
+        for post, date in zip(cls.posts, dates):
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=timezone.make_aware(datetime.datetime(*date, 12))
+            )
+        cls.changelist = reverse('admin:posts_post_changelist')
+
+    def setUp(self):
+        cache.clear()
+        self.admin_client = Client()
+        self.admin_client.force_login(self.user)
+
+    def test_changelist_counts_are_bounded(self):
+        """Список не считает таблицу целиком: COUNT только с LIMIT."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.admin_client.get(self.changelist)
+        self.assertEqual(response.status_code, 200)
+        counts = [
+            query['sql'] for query in queries
+            if 'COUNT(' in query['sql'] and 'posts_post' in query['sql']
+        ]
+        self.assertTrue(counts)
+        for sql in counts:
+            self.assertIn('LIMIT', sql)
+
+    def test_paginator_estimates_large_tables(self):
+        """Сверх лимита используется оценка, а не точный COUNT."""
+        queryset = Post.objects.all()
+        with mock.patch('posts.admin.EXACT_COUNT_LIMIT', 2):
+            self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 5)
+            filtered = queryset.filter(group=self.group)
+            self.assertEqual(EstimatedCountPaginator(filtered, 2).count, 2)
+        self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 5)
+
+    def test_dates_match_queryset_dates(self):
+        """date_hierarchy видит те же периоды, что и QuerySet.dates()."""
+        indexed = IndexedDatesQuerySet(Post)
+        for kind in ('year', 'month', 'day'):
+            with self.subTest(kind=kind):
+                self.assertEqual(
+                    indexed.dates('pub_date', kind),
+                    list(Post.objects.dates('pub_date', kind)),
+                )
+        year = indexed.filter(pub_date__year=2020)
+        self.assertEqual(
+            year.dates('pub_date', 'month'),
+            [datetime.date(2020, 3, 1), datetime.date(2020, 7, 1)],
+        )
+
+    def test_date_hierarchy_drilldown(self):
+        """Навигация по датам фильтрует список."""
+        response = self.admin_client.get(
+            self.changelist, {'pub_date__year': 2020, 'pub_date__month': 3}
+        )
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+    def test_move_to_group_asks_for_group(self):
+        """Действие сначала показывает форму выбора группы."""
+        response = self.admin_client.post(self.changelist, {
+            'action': 'move_to_group',
+            'index': 0,
+            helpers.ACTION_CHECKBOX_NAME: [self.posts[0].pk],
+        })
+        self.assertTemplateUsed(
+            response, 'admin/posts/post/move_to_group.html'
+        )
+
+    def test_move_to_group_runs_single_update(self):
+        """Перенос в группу — один UPDATE для всех выбранных постов."""
+        selected = [post.pk for post in self.posts[:3]]
+        with CaptureQueriesContext(connection) as queries:
+            self.admin_client.post(self.changelist, {
+                'action': 'move_to_group',
+                helpers.ACTION_CHECKBOX_NAME: selected,
+                'select_across': '0',
+                'apply': '1',
+                'group': self.new_group.pk,
+            })
+        updates = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('UPDATE "posts_post"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(
+            set(self.new_group.group_posts.values_list('pk', flat=True)),
+            set(selected),
+        )
+
+    def test_move_to_group_invalidates_feeds(self):
+        """После переноса лента новой группы показывает посты."""
+        url = reverse('posts:group_list', kwargs={'slug': self.new_group.slug})
+        self.assertEqual(len(self.client.get(url).context['page_obj']), 0)
+        self.admin_client.post(self.changelist, {
+            'action': 'move_to_group',
+            helpers.ACTION_CHECKBOX_NAME: [self.posts[0].pk],
+            'select_across': '1',
+            'apply': '1',
+            'group': self.new_group.pk,
+        })
+        self.assertEqual(len(self.client.get(url).context['page_obj']), 5)
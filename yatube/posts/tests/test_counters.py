@@ -0,0 +1,128 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import (
+    AuthorStats, Comment, Follow, Post, PostLocator, TimelineEntry,
+)
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_post_and_comment_counters(self):
+        """Счётчики постов и комментариев следуют за созданием и удалением."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            data={'text': 'Комментарий'},
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        Comment.objects.get(post=post).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_post_delete_skips_comment_counters(self):
+        """Удаление поста не трогает счётчик и кеш за каждый комментарий:
+        число запросов не зависит от числа комментариев."""
+        queries = []
+        for comments in (3, 30):
+            post = Post.objects.create(author=self.author, text='Пост')
+            Comment.objects.bulk_create(
+                Comment(post=post, author=self.reader, text='К')
+                for _ in range(comments)
+            )
+            with CaptureQueriesContext(connection) as captured:
+                post.delete()
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+        self.assertFalse(Comment.objects.exists())
+
+    def test_post_author_change(self):
+        """Смена автора поста переносит счётчик, ленты подписчиков и
+        PostLocator."""
+        fan = User.objects.create_user(username='Fan')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=fan, author=self.reader)
+        post = Post.objects.create(author=self.author, text='Пост')
+        post.author = self.reader
+        post.save()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.stats(self.reader).posts_count, 1)
+        self.assertEqual(
+            PostLocator.objects.get(pk=post.pk).author_id, self.reader.pk
+        )
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(post=post).values_list(
+                'user_id', 'author_id'
+            )),
+            [(fan.pk, self.reader.pk)],
+        )
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики обеих сторон."""
+        follow_url = reverse(
+            'posts:profile_follow', kwargs={'username': self.author}
+        )
+        self.authorized_client.get(follow_url)
+        self.authorized_client.get(follow_url)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.authorized_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}
+        ))
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_user_delete_cascade(self):
+        """Каскадное удаление автора не ломает счётчики читателя."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(author=self.author, text='Пост')
+        self.author.delete()
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        self.assertFalse(
+            AuthorStats.objects.filter(user_id=self.author.pk).exists()
+        )
+
+    def test_recount_stats_reconciles(self):
+        """recount_stats создаёт недостающие и чинит разошедшиеся счётчики."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorStats.objects.filter(user=self.author).delete()
+        AuthorStats.objects.filter(user=self.reader).update(
+            following_count=7
+        )
+        Post.objects.filter(pk=post.pk).update(comments_count=5)
+        out = StringIO()
+        call_command('recount_stats', batch_size=1, stdout=out)
+        author = self.stats(self.author)
+        self.assertEqual(
+            (author.posts_count, author.followers_count), (1, 1)
+        )
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertIn('checkpoint', out.getvalue())
@@ -0,0 +1,155 @@
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class QueryPlanTest(TestCase):
+    """EXPLAIN QUERY PLAN запросов, которые выполняют страницы.
+
+    Каждый запрос должен читать строки уже в нужном порядке по индексу,
+    без сортировки во временном B-дереве (USE TEMP B-TREE FOR ORDER BY).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestMan')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Пост'
+        )
+
+    def assertPlanUses(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_index_feed(self):
+        """index.
+
+        До:    SCAN posts_post + USE TEMP B-TREE FOR ORDER BY
+        После: SCAN posts_post USING INDEX post_pub_date_id_idx
+        """
+        self.assertPlanUses(Post.objects.feed()[:11], 'post_pub_date_id_idx')
+
+    def test_group_feed(self):
+        """group_list.
+
+        До:    SEARCH posts_post USING INDEX posts_post_group_id_... +
+               USE TEMP B-TREE FOR ORDER BY
+        После: SEARCH posts_post USING INDEX post_group_pub_date_idx
+        """
+        self.assertPlanUses(
+            self.group.group_posts.feed()[:11], 'post_group_pub_date_idx'
+        )
+
+    def test_profile_feed(self):
+        """profile.
+
+        До:    SEARCH posts_post USING INDEX posts_post_author_id_... +
+               USE TEMP B-TREE FOR ORDER BY
+        После: SEARCH posts_post USING INDEX post_author_pub_date_idx
+        """
+        self.assertPlanUses(
+            self.user.author_posts.feed()[:11], 'post_author_pub_date_idx'
+        )
+
+    def test_post_comments(self):
+        """post_detail, комментарии.
+
+        До:    SEARCH posts_comment USING INDEX posts_comment_post_id_... +
+               USE TEMP B-TREE FOR ORDER BY
+        После: SEARCH posts_comment USING INDEX comment_post_created_idx
+        """
+        self.assertPlanUses(
+            Comment.objects.filter(post=self.post).select_related('author'),
+            'comment_post_created_idx',
+        )
+
+    def test_follow_lookup(self):
+        """profile, проверка подписки.
+
+        До:    SEARCH posts_follow USING INDEX posts_follow_user_id_...
+        После: SEARCH posts_follow USING COVERING INDEX
+               (user_id=? AND author_id=?)
+        """
+        plan = Follow.objects.filter(
+            user=self.user, author=self.user
+        ).explain()
+        self.assertIn('COVERING INDEX', plan)
+
+    def test_follow_feed(self):
+        """follow_index.
+
+        До (Post x Follow):
+               SEARCH posts_follow USING INDEX posts_follow_user_id_... +
+               SEARCH posts_post USING INDEX posts_post_author_id_... +
+               USE TEMP B-TREE FOR ORDER BY
+        После: SEARCH posts_timelineentry USING INDEX
+               timeline_user_pub_date_idx (user_id=?)
+        """
+        self.assertPlanUses(
+            TimelineEntry.objects.filter(user=self.user).select_related(
+                'post__author', 'post__group'
+            )[:11],
+            'timeline_user_pub_date_idx',
+        )
+
+
+class FollowUniqueTest(TestCase):
+    def test_follow_is_unique(self):
+        """Повторная подписка на того же автора отклоняется базой."""
+        user = User.objects.create_user(username='Reader')
+        author = User.objects.create_user(username='Author')
+        Follow.objects.create(user=user, author=author)
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=user, author=author)
+
+
+class DedupeFollowsMigrationTest(TransactionTestCase):
+    """0010_hot_path_indexes чистит дубли подписок до UNIQUE."""
+
+    before = [('posts', '0009_counters')]
+    after = [('posts', '0010_hot_path_indexes')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def test_duplicates_removed(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        OldUser = apps.get_model('auth', 'User')
+        OldFollow = apps.get_model('posts', 'Follow')
+        reader = OldUser.objects.create(username='Reader')
+        authors = [
+            OldUser.objects.create(username=f'Author{number}')
+            for number in range(2)
+        ]
+        first = OldFollow.objects.create(user=reader, author=authors[0])
+        for _ in range(2):
+            OldFollow.objects.create(user=reader, author=authors[0])
+        OldFollow.objects.create(user=reader, author=authors[1])
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        pairs = list(
+            Follow.objects.order_by('author_id').values_list(
+                'user_id', 'author_id'
+            )
+        )
+        self.assertEqual(
+            pairs,
+            [(reader.pk, authors[0].pk), (reader.pk, authors[1].pk)],
+        )
+        self.assertTrue(Follow.objects.filter(pk=first.pk).exists())
@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.test import Client, SimpleTestCase, override_settings
+
+from posts.storage import ContentAddressedStorage
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+CONTENT = bytes(range(256)) * 4
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaServeTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT):
+            cls.name = ContentAddressedStorage().save(
+                'posts/image.jpg', ContentFile(CONTENT)
+            )
+        cls.url = settings.MEDIA_URL + cls.name
+        thumbnail = os.path.join(TEMP_MEDIA_ROOT, 'cache', 'thumb.jpg')
+        os.makedirs(os.path.dirname(thumbnail))
+        with open(thumbnail, 'wb') as file:
+            file.write(CONTENT)
+        with open(os.path.join(TEMP_MEDIA_ROOT, 'cache', 'kv.db'), 'wb'):
+            pass
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+
+    def _body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_content_named_file_is_immutable(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._body(response), CONTENT)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertIn('immutable', response['Cache-Control'])
+        digest = self.name.rsplit('/', 1)[1].split('.')[0]
+        self.assertEqual(response['ETag'], f'"{digest}"')
+
+    def test_other_files_revalidate(self):
+        response = self.client.get('/media/cache/thumb.jpg')
+        self.assertEqual(
+            response['Cache-Control'],
+            f'public, max-age={settings.MEDIA_MAX_AGE}',
+        )
+        for headers in (
+            {'HTTP_IF_NONE_MATCH': response['ETag']},
+            {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']},
+        ):
+            revalidated = self.client.get('/media/cache/thumb.jpg', **headers)
+            self.assertEqual(revalidated.status_code, 304)
+            self.assertEqual(revalidated['ETag'], response['ETag'])
+
+    def test_range(self):
+        """Один диапазон — 206 с куском; вне файла — 416."""
+        size = len(CONTENT)
+        for header, start, end in (
+            ('bytes=2-5', 2, 5),
+            ('bytes=1000-', 1000, size - 1),
+            ('bytes=-3', size - 3, size - 1),
+            ('bytes=10-99999', 10, size - 1),
+        ):
+            with self.subTest(header=header):
+                response = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(
+                    response['Content-Range'], f'bytes {start}-{end}/{size}'
+                )
+                self.assertEqual(
+                    self._body(response), CONTENT[start:end + 1]
+                )
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+
+    def test_if_range(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(
+            self.url, HTTP_RANGE='bytes=0-0', HTTP_IF_RANGE=etag
+        )
+        self.assertEqual(response.status_code, 206)
+        response = self.client.get(
+            self.url, HTTP_RANGE='bytes=0-0', HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._body(response), CONTENT)
+
+    def test_head(self):
+        response = self.client.head(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(response.content, b'')
+
+    def test_not_served(self):
+        """Только картинки из MEDIA_ROOT, без служебных файлов."""
+        for path in (
+            'cache/kv.db', 'posts/missing.jpg', 'posts',
+            '.incoming/x.jpg', '../settings.jpg',
+        ):
+            with self.subTest(path=path):
+                response = self.client.get(settings.MEDIA_URL + path)
+                self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
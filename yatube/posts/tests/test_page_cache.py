@@ -0,0 +1,102 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.middleware import page_cache_metrics
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestMan')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый пост'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+
+    def test_anonymous_hit_runs_no_queries(self):
+        """Повторный анонимный запрос отдаётся из кеша без SQL."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertEqual(first['X-Page-Cache'], 'MISS')
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(second['X-Page-Cache'], 'HIT')
+                self.assertEqual(second.content, first.content)
+
+    def test_change_purges_tagged_pages(self):
+        """Комментарий к посту сбрасывает только страницы с этим постом."""
+        other_group = Group.objects.create(
+            title='Другая', slug='other', description='Описание'
+        )
+        other_url = reverse(
+            'posts:group_list', kwargs={'slug': other_group.slug}
+        )
+        for url in self.urls + (other_url,):
+            self.client.get(url)
+        Comment.objects.create(post=self.post, author=self.user, text='К')
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url)['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.client.get(other_url)['X-Page-Cache'], 'HIT')
+        self.assertEqual(page_cache_metrics()['purges'], len(self.urls))
+
+    def test_user_rename_purges_pages(self):
+        """Переименование автора сбрасывает страницы с его постами,
+        комментатора — страницу поста с его комментарием."""
+        commenter = User.objects.create_user(username='Commenter')
+        Comment.objects.create(post=self.post, author=commenter, text='К')
+        for url in self.urls:
+            self.client.get(url)
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = 'Новое'
+        author.last_name = 'Имя'
+        author.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response['X-Page-Cache'], 'MISS')
+                self.assertContains(response, 'Новое Имя')
+        commenter.username = 'Renamed'
+        commenter.save()
+        detail = self.client.get(self.urls[-1])
+        self.assertEqual(detail['X-Page-Cache'], 'MISS')
+        self.assertContains(detail, 'Renamed')
+
+    def test_logged_in_users_bypass_cache(self):
+        """Авторизованные пользователи не получают чужие страницы."""
+        self.client.get(reverse('posts:index'))
+        authorized_client = Client()
+        authorized_client.force_login(self.user)
+        response = authorized_client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertContains(response, self.user.username)
+
+    def test_metrics_endpoint(self):
+        """Счётчики hit/miss/purge доступны для сбора метрик."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        self.client.get(url)
+        response = self.client.get(reverse('posts:page_cache_stats'))
+        self.assertContains(response, 'yatube_page_cache_hits_total 1')
+        self.assertContains(response, 'yatube_page_cache_misses_total 1')
+        self.assertContains(response, 'yatube_page_cache_purges_total 0')
@@ -0,0 +1,103 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+AUTHORS = 5
+
+# Бюджет SQL-запросов на одну страницу. Не зависит от числа постов,
+# авторов, групп и комментариев на странице. Первый запрос group_list,
+# profile и post_detail — индексный поиск валидаторов условного GET
+# (conditional_page); валидатору главной база не нужна.
+#   index:        COUNT + страница постов с автором и группой
+#   group_list:   валидатор + группа + COUNT + страница
+#   profile:      валидатор + автор со счётчиками + COUNT + страница
+#   post_detail:  валидатор + пост с автором, его счётчиками и группой
+#                 + комментарии с авторами
+#   follow_index: сессия + пользователь + COUNT + страница ленты
+QUERY_BUDGETS = {
+    'posts:index': 2,
+    'posts:group_list': 4,
+    'posts:profile': 4,
+    'posts:post_detail': 3,
+    'posts:follow_index': 4,
+}
+
+# Повторный запрос отдаётся из кеша лент: остаются только запросы,
+# нужные до обращения к кешу.
+#   index: ничего; group_list: валидатор + группа;
+#   profile: валидатор + автор со счётчиками
+CACHED_QUERY_BUDGETS = {
+    'posts:index': 0,
+    'posts:group_list': 2,
+    'posts:profile': 2,
+}
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [
+            User.objects.create_user(username=f'user{i}')
+            for i in range(AUTHORS)
+        ]
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа {i}',
+                slug=f'group-{i}',
+                description='Тестовое описание',
+            )
+            for i in range(AUTHORS)
+        ]
+        for author in cls.users[1:]:
+            Follow.objects.create(user=cls.users[0], author=author)
+        for i in range(20):
+            cls.post = Post.objects.create(
+                author=cls.users[i % AUTHORS],
+                group=cls.groups[i % AUTHORS],
+                text=f'Пост {i}',
+            )
+            for j in range(3):
+                Comment.objects.create(
+                    post=cls.post,
+                    author=cls.users[(i + j) % AUTHORS],
+                    text='Комментарий',
+                )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.users[0])
+
+    def test_views_stay_within_query_budget(self):
+        """Каждая страница укладывается в свой бюджет запросов."""
+        pages = {
+            'posts:index': (self.client, {}),
+            'posts:group_list': (self.client, {'slug': self.groups[1].slug}),
+            'posts:profile': (self.client, {'username': self.users[1]}),
+            'posts:post_detail': (self.client, {'post_id': self.post.pk}),
+            'posts:follow_index': (self.authorized_client, {}),
+        }
+        for name, (client, kwargs) in pages.items():
+            with self.subTest(view=name):
+                with self.assertNumQueries(QUERY_BUDGETS[name]):
+                    client.get(reverse(name, kwargs=kwargs))
+
+    @override_settings(PAGE_CACHE_ENABLED=False)
+    def test_cached_feeds_skip_feed_queries(self):
+        """Повторный запрос ленты не строит queryset."""
+        pages = {
+            'posts:index': {},
+            'posts:group_list': {'slug': self.groups[1].slug},
+            'posts:profile': {'username': self.users[1]},
+        }
+        for name, kwargs in pages.items():
+            with self.subTest(view=name):
+                self.client.get(reverse(name, kwargs=kwargs))
+                with self.assertNumQueries(CACHED_QUERY_BUDGETS[name]):
+                    self.client.get(reverse(name, kwargs=kwargs))
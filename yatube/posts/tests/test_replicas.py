@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts.management.commands.refresh_replicas import refresh_replica
+from posts.models import Post
+
+User = get_user_model()
+
+REPLICA_DIR = tempfile.mkdtemp()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], PAGE_CACHE_ENABLED=False)
+@mock.patch('posts.routers.LAG_CHECK_INTERVAL', 0)
+class ReplicaRouterTest(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        connections.databases['replica'] = dict(
+            connections.databases['default'],
+            NAME=os.path.join(REPLICA_DIR, 'replica.sqlite3'),
+        )
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections.databases['replica']
+        shutil.rmtree(REPLICA_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='TestMan')
+        self.post = Post.objects.create(author=self.user, text='Старый пост')
+        refresh_replica('replica')
+        self.fresh = Post.objects.create(author=self.user, text='Новый пост')
+        self.client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_reads_go_to_fresh_replica(self):
+        """Чтение идёт на реплику: в ней нет поста после копирования."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Новый пост')
+        self.assertContains(response, 'Старый пост')
+        refresh_replica('replica')
+        # Страница с реплики лежит в кеше до REPLICA_MAX_LAG секунд.
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый пост')
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        """Реплика старше REPLICA_MAX_LAG не используется."""
+        with connections['replica'].cursor() as cursor:
+            cursor.execute(
+                'UPDATE replica_meta SET synced_at = %s',
+                [time.time() - 3600],
+            )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Новый пост')
+
+    def test_writer_reads_own_writes(self):
+        """После записи клиент читает основную базу или более свежую
+        копию."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Свежий комментарий'},
+        )
+        self.assertIn('primary_pin', response.cookies)
+        self.assertContains(
+            self.authorized_client.get(url), 'Свежий комментарий'
+        )
+        self.assertNotContains(self.client.get(url), 'Свежий комментарий')
+        refresh_replica('replica')
+        self.assertContains(self.client.get(url), 'Свежий комментарий')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_pin_without_replicas(self):
+        """Без реплик запись не ставит cookie primary_pin."""
+        response = self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий'},
+        )
+        self.assertNotIn('primary_pin', response.cookies)
+        self.user.set_password('secret')
+        self.user.save()
+        response = Client().post(
+            reverse('users:login'),
+            {'username': 'TestMan', 'password': 'secret'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn('primary_pin', response.cookies)
+
+    def test_replica_data_cached_briefly(self):
+        """Страница, прочитанная с реплики, кешируется не дольше
+        REPLICA_MAX_LAG."""
+        with mock.patch('posts.cache.cache.set') as cache_set:
+            self.client.get(reverse('posts:index'))
+        timeouts = {call[0][2] for call in cache_set.call_args_list}
+        self.assertEqual(timeouts, {10})
+
+    @override_settings(PAGE_CACHE_ENABLED=True)
+    def test_replica_page_cached_briefly(self):
+        """Кеш страниц тоже хранит страницу с реплики не дольше
+        REPLICA_MAX_LAG, хотя ReplicaPinMiddleware уже сбросила
+        состояние запроса."""
+        with mock.patch('posts.middleware.cache.set') as cache_set:
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        timeouts = {
+            call[0][2] for call in cache_set.call_args_list
+            if call[0][0].startswith('page:')
+        }
+        self.assertEqual(timeouts, {10})
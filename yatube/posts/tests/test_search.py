@@ -0,0 +1,101 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Group, Post
+from posts.search import search_posts
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestMan')
+        cls.other = User.objects.create_user(username='Other')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.cat_post = Post.objects.create(
+            author=cls.user, group=cls.group,
+            text='Кот спит на <b>окне</b>. Кот, кот и ещё раз кот.',
+        )
+        cls.dog_post = Post.objects.create(
+            author=cls.other, text='Собака и кот гуляют во дворе',
+        )
+
+    def test_ranked_results_with_snippet(self):
+        """Результаты упорядочены по BM25, совпадения подсвечены."""
+        response = self.client.get(reverse('posts:search'), {'q': 'КОТ'})
+        results = response.context['results']
+        self.assertEqual(results, [self.cat_post, self.dog_post])
+        self.assertIn('<mark>Кот</mark>', results[0].snippet)
+        self.assertIn('&lt;b&gt;', results[0].snippet)
+
+    def test_filters_by_group_and_author(self):
+        """Поиск сужается группой и автором."""
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'кот', 'group': self.group.slug}
+        )
+        self.assertEqual(response.context['results'], [self.cat_post])
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'кот', 'author': self.other}
+        )
+        self.assertEqual(response.context['results'], [self.dog_post])
+
+    def test_keyset_pagination(self):
+        """Курсор продолжает выдачу без повторов."""
+        first, cursor = search_posts('кот', 1)
+        self.assertEqual(first, [self.cat_post])
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'кот', 'after': cursor}
+        )
+        self.assertEqual(response.context['results'], [self.dog_post])
+        self.assertIsNone(response.context['next_cursor'])
+
+    def test_index_follows_updates_and_deletes(self):
+        """Триггеры держат индекс в синхронизации с posts_post."""
+        Post.objects.filter(pk=self.dog_post.pk).update(text='Собака спит')
+        self.assertEqual(search_posts('кот', 10)[0], [self.cat_post])
+        self.assertEqual(search_posts('собака', 10)[0], [self.dog_post])
+        Post.objects.filter(pk=self.cat_post.pk).delete()
+        self.assertEqual(search_posts('кот', 10)[0], [])
+
+    def test_operators_in_query_are_literal(self):
+        """Синтаксис FTS5 в запросе не ломает поиск."""
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'кот" OR NEAR(*'}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_rebuild_command(self):
+        """rebuild_search_index восстанавливает испорченный индекс."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO posts_post_fts(posts_post_fts) "
+                "VALUES ('delete-all')"
+            )
+        self.assertEqual(search_posts('кот', 10)[0], [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(search_posts('кот', 10)[0]), 2)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через полнотекстовый индекс."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собака'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.dog_post]
+        )
@@ -0,0 +1,146 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts.models import AuthorShard, Comment, Follow, Post, PostLocator
+from posts.sharding import AuthorMoving, move_author, shard_for_author
+
+User = get_user_model()
+
+SHARD_DIR = tempfile.mkdtemp()
+
+
+@override_settings(
+    POST_SHARDS=['default', 'shard1'], PAGE_CACHE_ENABLED=False
+)
+class ShardingTest(TransactionTestCase):
+    databases = {'default', 'shard1'}
+
+    @classmethod
+    def setUpClass(cls):
+        connections.databases['shard1'] = dict(
+            connections.databases['default'],
+            NAME=os.path.join(SHARD_DIR, 'shard1.sqlite3'),
+        )
+        super().setUpClass()
+        call_command('migrate', database='shard1', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['shard1'].close()
+        del connections.databases['shard1']
+        shutil.rmtree(SHARD_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.local = User.objects.create_user(username='Local')
+        self.remote = User.objects.create_user(username='Remote')
+        AuthorShard.objects.create(user=self.local, shard='default')
+        AuthorShard.objects.create(user=self.remote, shard='shard1')
+        self.old = Post.objects.create(author=self.local, text='Пост default')
+        self.new = Post.objects.create(author=self.remote, text='Пост shard1')
+        self.client = Client()
+        self.client.force_login(self.local)
+
+    def test_post_goes_to_author_shard(self):
+        """Пост пишется на шард автора, id выдаёт общий PostLocator."""
+        self.assertFalse(Post.objects.filter(pk=self.new.pk).exists())
+        self.assertTrue(
+            Post.objects.using('shard1').filter(pk=self.new.pk).exists()
+        )
+        self.assertNotEqual(self.old.pk, self.new.pk)
+        self.assertEqual(
+            set(PostLocator.objects.values_list('pk', flat=True)),
+            {self.old.pk, self.new.pk},
+        )
+
+    def test_index_merges_shards(self):
+        """Главная собирает посты со всех шардов, свежие первыми."""
+        response = self.client.get(reverse('posts:index'))
+        posts = list(response.context['page_obj'])
+        self.assertEqual(
+            [post.pk for post in posts], [self.new.pk, self.old.pk]
+        )
+        self.assertEqual(posts[0].author, self.remote)
+
+    def test_single_shard_pages(self):
+        """Профиль, пост и комментарий работают на шарде автора."""
+        response = self.client.get(
+            reverse('posts:profile', args=[self.remote.username])
+        )
+        self.assertEqual(list(response.context['page_obj']), [self.new])
+        self.client.post(
+            reverse('posts:add_comment', args=[self.new.pk]),
+            {'text': 'Комментарий'},
+        )
+        comment = Comment.objects.using('shard1').get()
+        self.assertEqual(comment.author, self.local)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.new.pk])
+        )
+        self.assertEqual(response.context['post'].comments_count, 1)
+        self.assertContains(response, 'Комментарий')
+
+    def test_follow_index_reads_author_shard(self):
+        Follow.objects.create(user=self.local, author=self.remote)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [self.new])
+
+    def test_move_author(self):
+        """После переноса посты и комментарии автора на новом шарде."""
+        Comment.objects.create(
+            post=self.new, author=self.local, text='Комментарий'
+        )
+        move_author(self.remote.pk, 'default', grace=0)
+        self.assertEqual(shard_for_author(self.remote.pk), 'default')
+        self.assertFalse(Post.objects.using('shard1').exists())
+        self.assertFalse(Comment.objects.using('shard1').exists())
+        post = Post.objects.get(pk=self.new.pk)
+        self.assertEqual(post.comments_count, 1)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.new.pk])
+        )
+        self.assertContains(response, 'Комментарий')
+
+    def test_move_author_closes_writes(self):
+        """Пока данные догоняются, запись автора закрыта, а сделанное до
+        этого на старом шарде не теряется."""
+        def during_grace(seconds):
+            if shard_for_author(self.remote.pk) != 'shard1':
+                return
+            # Записи, попавшие на старый шард после первого копирования.
+            Post.objects.using('shard1').filter(pk=self.new.pk).update(
+                text='Исправленный пост'
+            )
+            Comment.objects.using('shard1').create(
+                post_id=self.new.pk, author=self.local, text='Поздний'
+            )
+            with self.assertRaises(AuthorMoving):
+                Comment.objects.create(
+                    post=self.new, author=self.local, text='Закрыто'
+                )
+            response = self.client.post(
+                reverse('posts:add_comment', args=[self.new.pk]),
+                {'text': 'Закрыто'},
+            )
+            self.assertEqual(response.status_code, 503)
+
+        with mock.patch('posts.sharding.time.sleep', during_grace):
+            move_author(self.remote.pk, 'default', grace=1)
+        post = Post.objects.get(pk=self.new.pk)
+        self.assertEqual(post.text, 'Исправленный пост')
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(
+            list(post.comments.values_list('text', flat=True)), ['Поздний']
+        )
+        self.assertFalse(AuthorShard.objects.get(user=self.remote).moving)
+        Comment.objects.create(post=post, author=self.local, text='Открыто')
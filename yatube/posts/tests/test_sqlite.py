@@ -0,0 +1,35 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase
+
+
+class SqliteProfileTest(SimpleTestCase):
+    def test_new_connection_gets_pragmas(self):
+        """Новое соединение с файловой базой получает профиль PRAGMA."""
+        with tempfile.TemporaryDirectory() as directory:
+            settings_dict = dict(
+                connections.databases['default'],
+                NAME=os.path.join(directory, 'profile.sqlite3'),
+            )
+            wrapper = DatabaseWrapper(settings_dict, alias='profile')
+            try:
+                with wrapper.cursor() as cursor:
+                    expected = {
+                        'journal_mode': 'wal',
+                        'synchronous': 1,
+                        'busy_timeout': settings.SQLITE_PRAGMAS[
+                            'busy_timeout'
+                        ],
+                        'cache_size': settings.SQLITE_PRAGMAS['cache_size'],
+                        'mmap_size': settings.SQLITE_PRAGMAS['mmap_size'],
+                    }
+                    for pragma, value in expected.items():
+                        with self.subTest(pragma=pragma):
+                            cursor.execute(f'PRAGMA {pragma}')
+                            self.assertEqual(cursor.fetchone()[0], value)
+            finally:
+                wrapper.close()
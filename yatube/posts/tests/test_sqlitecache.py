@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from posts.sqlitecache import ACCESS_RESOLUTION, SQLiteCache
+
+
+def _increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('hits')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {})
+
+    def test_values_round_trip(self):
+        values = {
+            'int': 42, 'big': 2 ** 70, 'bool': True, 'text': 'пост',
+            'dict': {'posts': [1, 2]}, 'none': None,
+        }
+        self.cache.set_many(values)
+        self.assertEqual(self.cache.get_many(values), values)
+        self.assertIs(self.cache.get('bool'), True)
+        self.assertTrue(self.cache.has_key('none'))
+        self.cache.delete('int')
+        self.assertIsNone(self.cache.get('int'))
+        self.assertEqual(self.cache.get('int', 'нет'), 'нет')
+
+    def test_add_keeps_live_value(self):
+        self.assertTrue(self.cache.add('key', 'first'))
+        self.assertFalse(self.cache.add('key', 'second'))
+        self.assertEqual(self.cache.get('key'), 'first')
+        self.cache.set('key', 'expired', timeout=0)
+        self.assertTrue(self.cache.add('key', 'third'))
+        self.assertEqual(self.cache.get('key'), 'third')
+
+    def test_incr(self):
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter'), 2)
+        self.assertEqual(self.cache.incr('counter', 10), 12)
+        self.assertEqual(self.cache.decr('counter', 2), 10)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('counter', 5, timeout=0)
+        with self.assertRaises(ValueError):
+            self.cache.incr('counter')
+
+    def test_incr_non_integer_keeps_expiry(self):
+        """Значения вне INT64 увеличиваются через pickle, срок остаётся."""
+        with mock.patch('posts.sqlitecache.time.time', return_value=1000):
+            self.cache.set('big', 2 ** 70, timeout=10)
+            self.assertEqual(self.cache.incr('big'), 2 ** 70 + 1)
+        with mock.patch('posts.sqlitecache.time.time', return_value=1009):
+            self.assertEqual(self.cache.get('big'), 2 ** 70 + 1)
+        with mock.patch('posts.sqlitecache.time.time', return_value=1011):
+            self.assertIsNone(self.cache.get('big'))
+
+    def test_timeout(self):
+        with mock.patch('posts.sqlitecache.time.time', return_value=1000):
+            self.cache.set('short', 1, timeout=10)
+            self.cache.set('forever', 1, timeout=None)
+        with mock.patch('posts.sqlitecache.time.time', return_value=1009):
+            self.assertTrue(self.cache.touch('short', 10))
+        with mock.patch('posts.sqlitecache.time.time', return_value=1015):
+            self.assertEqual(self.cache.get('short'), 1)
+        with mock.patch('posts.sqlitecache.time.time', return_value=1020):
+            self.assertIsNone(self.cache.get('short'))
+            self.assertFalse(self.cache.has_key('short'))
+            self.assertFalse(self.cache.touch('short'))
+            self.assertEqual(self.cache.get('forever'), 1)
+
+    def test_cull_evicts_least_recently_read(self):
+        cache = SQLiteCache(
+            self.location, {'OPTIONS': {'MAX_ENTRIES': 10,
+                                        'CULL_FREQUENCY': 5}},
+        )
+        now = 1000
+        with mock.patch('posts.sqlitecache.time.time') as clock:
+            for number in range(12):
+                now += 1
+                clock.return_value = now
+                cache.set(f'key{number}', number, timeout=None)
+            clock.return_value = now + ACCESS_RESOLUTION + 1
+            self.assertEqual(cache.get('key0'), 0)
+            cache.cull()
+        # 12 записей при пределе 10: уходят 12 - 10 + 10 // 5 = 4.
+        self.assertEqual(cache.get('key0'), 0)
+        for number in (1, 2, 3, 4):
+            self.assertIsNone(cache.get(f'key{number}'))
+        self.assertEqual(cache.get('key5'), 5)
+
+    def test_shared_between_processes(self):
+        self.cache.set('hits', 0, timeout=None)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=_increment, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('hits'), 200)
+        SQLiteCache(self.location, {}).set('page', 'из другого процесса')
+        self.assertEqual(self.cache.get('page'), 'из другого процесса')
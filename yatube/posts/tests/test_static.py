@@ -0,0 +1,97 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import Client, SimpleTestCase, override_settings
+
+TEMP_STATIC_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_SOURCE = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+CSS = b'body { color: #333; }\n' * 200
+
+
+@override_settings(
+    STATIC_ROOT=TEMP_STATIC_ROOT, STATICFILES_DIRS=[TEMP_SOURCE]
+)
+class StaticFilesTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(TEMP_SOURCE, 'css'))
+        with open(os.path.join(TEMP_SOURCE, 'css', 'site.css'), 'wb') as f:
+            f.write(CSS)
+        os.makedirs(os.path.join(TEMP_SOURCE, 'img'))
+        with open(os.path.join(TEMP_SOURCE, 'img', 'logo.png'), 'wb') as f:
+            f.write(b'\x89PNG' + bytes(64))
+        call_command('collectstatic', interactive=False, verbosity=0)
+        cls.css_url = staticfiles_storage.url('css/site.css')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_STATIC_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_SOURCE, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+
+    def _body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_collectstatic_writes_hashed_and_gzip(self):
+        self.assertRegex(self.css_url, r'^/static/css/site\.\w{12}\.css$')
+        path = os.path.join(
+            TEMP_STATIC_ROOT, self.css_url[len(settings.STATIC_URL):]
+        )
+        with gzip.open(f'{path}.gz') as file:
+            self.assertEqual(file.read(), CSS)
+        # Картинки уже сжаты: .gz рядом с ними не пишется.
+        logo = staticfiles_storage.url('img/logo.png')[len('/static/'):]
+        self.assertFalse(
+            os.path.exists(os.path.join(TEMP_STATIC_ROOT, f'{logo}.gz'))
+        )
+
+    def test_precompressed_variant_by_accept_encoding(self):
+        response = self.client.get(
+            self.css_url, HTTP_ACCEPT_ENCODING='br, gzip;q=0.8'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(gzip.decompress(self._body(response)), CSS)
+        for accept in ('', 'gzip;q=0', 'br'):
+            with self.subTest(accept=accept):
+                response = self.client.get(
+                    self.css_url, HTTP_ACCEPT_ENCODING=accept
+                )
+                self.assertFalse(response.has_header('Content-Encoding'))
+                self.assertEqual(self._body(response), CSS)
+
+    def test_unhashed_name_revalidates(self):
+        response = self.client.get('/static/css/site.css')
+        self.assertEqual(
+            response['Cache-Control'], 'public, max-age=0, must-revalidate'
+        )
+        response = self.client.get(
+            '/static/css/site.css', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_template_uses_hashed_name(self):
+        rendered = Template(
+            "{% load static %}{% static 'css/site.css' %}"
+        ).render(Context())
+        self.assertEqual(rendered, self.css_url)
+
+    @override_settings(STATIC_ROOT=tempfile.gettempdir() + '/missing')
+    def test_without_manifest_plain_names(self):
+        """Без collectstatic шаблоны получают имена без хеша."""
+        self.assertEqual(
+            staticfiles_storage.url('css/site.css'), '/static/css/site.css'
+        )
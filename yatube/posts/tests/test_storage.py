@@ -0,0 +1,203 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts import thumbnails
+from posts.models import MediaFile, Post
+from posts.storage import is_content_name
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestMan')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def _create(self, name='small.gif', content=SMALL_GIF):
+        return Post.objects.create(
+            author=self.user, text='Пост с картинкой',
+            image=SimpleUploadedFile(name, content, 'image/gif'),
+        )
+
+    def refs(self, name):
+        return MediaFile.objects.get(name=name).refs
+
+    def test_identical_images_stored_once(self):
+        """Одинаковые байты — один файл по хешу и две ссылки на него."""
+        first = self._create('first.GIF')
+        second = self._create('second.gif')
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertTrue(is_content_name(name))
+        self.assertRegex(name, r'^posts/(\w\w)/(\w\w)/\1\2\w{60}\.gif$')
+        with open(first.image.path, 'rb') as file:
+            self.assertEqual(file.read(), SMALL_GIF)
+        self.assertEqual(self.refs(name), 2)
+        self.assertEqual(
+            os.listdir(os.path.join(TEMP_MEDIA_ROOT, '.incoming')), []
+        )
+        second.delete()
+        self.assertEqual(self.refs(name), 1)
+
+    def test_replaced_image_releases_reference(self):
+        post = self._create()
+        old = post.image.name
+        post.image = SimpleUploadedFile('new.gif', SMALL_GIF + b'\0')
+        post.save()
+        self.assertNotEqual(post.image.name, old)
+        self.assertEqual(self.refs(old), 0)
+        self.assertEqual(self.refs(post.image.name), 1)
+        post.text = 'Другой текст'
+        post.save()
+        self.assertEqual(self.refs(post.image.name), 1)
+
+    def test_migrate_media(self):
+        """Старые файлы переезжают по хешу, дубликаты сливаются."""
+        legacy = os.path.join(TEMP_MEDIA_ROOT, 'posts')
+        os.makedirs(legacy, exist_ok=True)
+        posts = []
+        for name in ('one.gif', 'two.gif'):
+            with open(os.path.join(legacy, name), 'wb') as file:
+                file.write(SMALL_GIF)
+            post = Post.objects.create(author=self.user, text=name)
+            Post.objects.filter(pk=post.pk).update(image=f'posts/{name}')
+            MediaFile.objects.create(name=f'posts/{name}', refs=1)
+            posts.append(post)
+        lost = Post.objects.create(author=self.user, text='Без файла')
+        Post.objects.filter(pk=lost.pk).update(image='posts/lost.gif')
+        # Ссылка на one.gif из следующей пачки: файл живёт до неё.
+        shared = Post.objects.create(author=self.user, text='Тот же файл')
+        Post.objects.filter(pk=shared.pk).update(image='posts/one.gif')
+        MediaFile.objects.filter(name='posts/one.gif').update(refs=2)
+        posts.append(shared)
+        out, err = StringIO(), StringIO()
+        call_command('migrate_media', batch_size=2, stdout=out, stderr=err)
+        self.assertIn('перенесено 3', out.getvalue())
+        self.assertIn('posts/lost.gif', err.getvalue())
+        names = {
+            Post.objects.get(pk=post.pk).image.name for post in posts
+        }
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(is_content_name(name))
+        self.assertEqual(self.refs(name), 3)
+        self.assertFalse(MediaFile.objects.filter(
+            name__in=['posts/one.gif', 'posts/two.gif']
+        ).exists())
+        for old in ('one.gif', 'two.gif'):
+            self.assertFalse(os.path.exists(os.path.join(legacy, old)))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CollectMediaTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestMan')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.kept = self._create(b'kept')
+        orphan = self._create(b'orphan')
+        self.orphan = orphan.image.name
+        for name in (self.kept.image.name, self.orphan):
+            thumbnails.build(name)
+        self.orphan_thumbnail = self._thumbnail(self.orphan)
+        orphan.delete()
+        self.stray = os.path.join(TEMP_MEDIA_ROOT, 'posts', 'stray.gif')
+        with open(self.stray, 'wb') as file:
+            file.write(SMALL_GIF)
+        # Всё старше --grace, кроме одного свежего файла.
+        old = time.time() - 2 * 24 * 3600
+        for root, _, files in os.walk(TEMP_MEDIA_ROOT):
+            for name in files:
+                os.utime(os.path.join(root, name), (old, old))
+        self.young = os.path.join(TEMP_MEDIA_ROOT, 'posts', 'young.gif')
+        with open(self.young, 'wb') as file:
+            file.write(SMALL_GIF)
+
+    def _create(self, tail):
+        return Post.objects.create(
+            author=self.user, text='Пост с картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF + tail),
+        )
+
+    def _thumbnail(self, name):
+        variant = next(thumbnails.variants())
+        return thumbnails.DeferredThumbnailBackend().lookup(
+            name, variant[2], variant[3]
+        )
+
+    def _collect(self, **options):
+        out = StringIO()
+        call_command('collect_media', stdout=out, **options)
+        return out.getvalue()
+
+    def _exists(self, name):
+        return os.path.exists(os.path.join(TEMP_MEDIA_ROOT, name))
+
+    def test_dry_run_touches_nothing(self):
+        output = self._collect(dry_run=True)
+        self.assertIn('не нужны', output)
+        self.assertIn('пробный прогон', output)
+        self.assertTrue(self._exists(self.orphan))
+        self.assertTrue(os.path.exists(self.stray))
+
+    def test_unreferenced_files_removed(self):
+        """Удаляются только ненужные и старые файлы и их записи."""
+        variants = len(list(thumbnails.variants()))
+        output = self._collect()
+        # исходник без поста, его превью и чужой файл
+        self.assertIn(f'не нужны {variants + 2} ', output)
+        self.assertIn('моложе --grace 1', output)
+        self.assertFalse(self._exists(self.orphan))
+        self.assertFalse(self._exists(self.orphan_thumbnail.name))
+        self.assertFalse(os.path.exists(self.stray))
+        self.assertIsNone(self._thumbnail(self.orphan))
+        self.assertFalse(MediaFile.objects.filter(name=self.orphan).exists())
+        self.assertTrue(os.path.exists(self.young))
+        self.assertTrue(self._exists(self.kept.image.name))
+        self.assertTrue(self._exists(self._thumbnail(
+            self.kept.image.name
+        ).name))
+        self.assertIn('не нужны 0 ', self._collect())
+
+    def test_quarantine(self):
+        quarantine = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, quarantine, ignore_errors=True)
+        self._collect(quarantine=quarantine)
+        self.assertFalse(self._exists(self.orphan))
+        self.assertTrue(
+            os.path.exists(os.path.join(quarantine, self.orphan))
+        )
@@ -0,0 +1,172 @@
+import itertools
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts import thumbnails
+from posts.cache import post_tags
+from posts.kvstore import KVStore
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+CARD = next(
+    (geometry, options)
+    for _, width, geometry, options in thumbnails.variants()
+    if width == settings.POST_IMAGE_SIZE[0]
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, PAGE_CACHE_ENABLED=False)
+class ThumbnailTest(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='TestMan')
+        self.client = Client()
+
+    serial = itertools.count()
+
+    def _create(self, name='small.gif', content=SMALL_GIF):
+        # Хвост после конца GIF делает файл уникальным: одинаковые байты
+        # хранилище сливает в один файл с общими превью.
+        content += str(next(self.serial)).encode()
+        return Post.objects.create(
+            author=self.user, text='Пост с картинкой',
+            image=SimpleUploadedFile(name, content, 'image/gif'),
+        )
+
+    def _lookup(self, post):
+        geometry, options = CARD
+        return thumbnails.DeferredThumbnailBackend().lookup(
+            post.image.name, geometry, options
+        )
+
+    def test_saved_post_gets_thumbnail_in_background(self):
+        """После сохранения поста превью считается без запроса страницы."""
+        post = self._create()
+        thumbnails.wait_pending(5)
+        self.assertIsNotNone(self._lookup(post))
+
+    def test_page_never_builds_thumbnail(self):
+        """Пока превью нет, страница отдаёт исходную картинку."""
+        with mock.patch('posts.signals.schedule_post'):
+            post = self._create()
+        with mock.patch(
+            'sorl.thumbnail.base.ThumbnailBackend._create_thumbnail'
+        ) as create, mock.patch('posts.thumbnails.schedule') as schedule:
+            response = self.client.get(reverse('posts:index'))
+        create.assert_not_called()
+        schedule.assert_called()
+        # Теги поста едут с заданием: превью не ищет посты по картинке.
+        for call in schedule.call_args_list:
+            self.assertEqual(call[0][3], post_tags(post))
+        self.assertContains(response, post.image.url)
+
+        thumbnails.schedule(post.image.name, *CARD)
+        thumbnails.wait_pending(5)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, self._lookup(post).url)
+        self.assertNotContains(response, post.image.url)
+
+    def test_broken_image_is_not_retried(self):
+        with mock.patch('posts.signals.schedule_post'):
+            post = self._create(name='broken.gif', content=b'not an image')
+        with self.assertLogs('sorl.thumbnail', 'ERROR'):
+            thumbnails.schedule(post.image.name, *CARD).result(5)
+        self.assertIsNone(self._lookup(post))
+        self.assertIsNone(thumbnails.schedule(post.image.name, *CARD))
+
+    @mock.patch(
+        'posts.management.commands.build_thumbnails.ProcessPoolExecutor',
+        ThreadPoolExecutor,
+    )
+    def test_build_thumbnails_command(self):
+        """Команда строит недостающие превью и пропускает готовые."""
+        with mock.patch('posts.signals.schedule_post'):
+            first, second = self._create(), self._create()
+        out = StringIO()
+        call_command(
+            'build_thumbnails', start_after=first.pk, stdout=out
+        )
+        self.assertIn('построено 1,', out.getvalue())
+        self.assertIsNone(self._lookup(first))
+        self.assertIsNotNone(self._lookup(second))
+
+        out = StringIO()
+        call_command('build_thumbnails', batch_size=1, stdout=out)
+        self.assertIn('картинок 2, построено 1,', out.getvalue())
+        self.assertIn(f'checkpoint: {second.pk}', out.getvalue())
+        self.assertIsNotNone(self._lookup(first))
+
+    def test_kvstore_is_shared_between_processes(self):
+        """Холодный процесс видит превью другого и не трогает файлы."""
+        with mock.patch('posts.signals.schedule_post'):
+            post = self._create()
+        geometry, options = CARD
+        with mock.patch('sorl.thumbnail.default.kvstore', KVStore()):
+            self.assertIsNone(self._lookup(post))
+            # Превью строит другой процесс со своим соединением.
+            with mock.patch('sorl.thumbnail.default.kvstore', KVStore()):
+                thumbnails.build(post.image.name)
+            with mock.patch(
+                'django.core.files.storage.FileSystemStorage.exists'
+            ) as exists, mock.patch(
+                'django.core.files.storage.FileSystemStorage.size'
+            ) as size:
+                thumbnail = self._lookup(post)
+            exists.assert_not_called()
+            size.assert_not_called()
+        self.assertEqual(thumbnail.x, 960)
+
+    @override_settings(POST_IMAGE_FORMATS=('PNG', 'JPEG'))
+    def test_page_renders_responsive_variants(self):
+        """Карточка отдаёт srcset по ширинам и <source> на каждый формат."""
+        post = self._create()
+        thumbnails.wait_pending(5)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<source type="image/png"')
+        for width in settings.POST_IMAGE_WIDTHS:
+            self.assertContains(response, f' {width}w', count=2)
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertNotContains(response, post.image.url)
+
+    def test_upload_does_not_wait_for_thumbnails(self):
+        """Запрос с загрузкой только ставит превью в очередь."""
+        self.client.force_login(self.user)
+        with mock.patch('posts.thumbnails.wait') as wait:
+            self.client.post(reverse('posts:post_create'), {
+                'text': 'Пост с картинкой',
+                'image': SimpleUploadedFile(
+                    'small.gif', SMALL_GIF, 'image/gif'
+                ),
+            })
+        wait.assert_not_called()
+        thumbnails.wait_pending(5)
+        self.assertIsNotNone(self._lookup(Post.objects.get()))
@@ -0,0 +1,179 @@
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import zlib
+from io import BytesIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+# Пик памяти одной проверки картинки в отдельном процессе, КиБ.
+# VmHWM, а не ru_maxrss: ru_maxrss наследует пик родителя через exec.
+MEASURE = '''
+import os, sys
+import django
+django.setup()
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
+from posts.uploads import clean_image
+
+
+class Upload(UploadedFile):
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def peak():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+
+
+mode, path = sys.argv[1:]
+before = peak()
+if mode == 'clean':
+    upload = Upload(open(path, 'rb'), os.path.basename(path), 'image/jpeg',
+                    os.path.getsize(path))
+    print(clean_image(upload).size, file=sys.stderr)
+else:
+    Image.open(path).load()
+print(peak() - before)
+'''
+
+
+def _chunk(kind, data):
+    return (
+        struct.pack('>I', len(data)) + kind + data
+        + struct.pack('>I', zlib.crc32(kind + data))
+    )
+
+
+def _png_header(width, height):
+    """PNG в пару сотен байт, который заявляет width x height пикселей."""
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + _chunk(
+            b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+        )
+        + _chunk(b'IDAT', zlib.compress(b''))
+        + _chunk(b'IEND', b'')
+    )
+
+
+def _jpeg(size):
+    buffer = BytesIO()
+    Image.new('RGB', size, (120, 30, 200)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class UploadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestMan')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def _create(self, name, content):
+        return self.client.post(reverse('posts:post_create'), {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(name, content, 'image/jpeg'),
+        })
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1000)
+    def test_byte_cap(self):
+        response = self._create('big.jpg', _jpeg((300, 300)) + b'\0' * 2000)
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 1000\xa0байт.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_BYTES=70 * 1024)
+    def test_admin_checks_upload(self):
+        """Админка не сохраняет файл, обрезанный обработчиком загрузки."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        response = self.client.post(reverse('admin:posts_post_add'), {
+            'text': 'Пост из админки',
+            'author': admin.pk,
+            'image': SimpleUploadedFile(
+                'big.jpg', _jpeg((300, 300)) + b'\0' * 100 * 1024,
+                'image/jpeg',
+            ),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(
+            response, 'adminform', 'image', 'Файл больше 70,0\xa0КБ.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    def test_pixel_cap_checked_from_header(self):
+        """Бомба распаковки отклоняется по заголовку, без декодирования."""
+        response = self._create('bomb.png', _png_header(8000, 7000))
+        self.assertFormError(
+            response, 'form', 'image', 'Слишком много пикселей.'
+        )
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_large_image_is_downscaled(self):
+        self._create('wide.jpg', _jpeg((1000, 400)))
+        post = Post.objects.get()
+        self.assertEqual((post.image.width, post.image.height), (100, 40))
+
+    @override_settings(
+        POST_IMAGE_MAX_SIDE=100, POST_IMAGE_DECODE_PIXELS=1000
+    )
+    def test_decode_budget(self):
+        """PNG не уменьшить при чтении: больше бюджета — отказ."""
+        buffer = BytesIO()
+        Image.new('RGB', (400, 300)).save(buffer, 'PNG')
+        response = self._create('wide.png', buffer.getvalue())
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Post.objects.exists())
+
+    @skipUnless(os.path.exists('/proc/self/status'), 'нужен Linux')
+    def test_peak_memory_is_capped(self):
+        """Пик памяти при уменьшении JPEG 8000x6000 укладывается в
+        POST_IMAGE_DECODE_PIXELS x 8 байт; полное декодирование — нет."""
+        path = os.path.join(TEMP_MEDIA_ROOT, 'huge.jpg')
+        with open(path, 'wb') as file:
+            file.write(_jpeg((8000, 6000)))
+        peaks = {}
+        for mode in ('clean', 'load'):
+            result = subprocess.run(
+                [sys.executable, '-c', MEASURE, mode, path],
+                cwd=settings.BASE_DIR, capture_output=True, check=True,
+                env=dict(
+                    os.environ, DJANGO_SETTINGS_MODULE='yatube.settings'
+                ),
+                text=True,
+            )
+            peaks[mode] = int(result.stdout) * 1024
+        cap = settings.POST_IMAGE_DECODE_PIXELS * 8
+        self.assertLess(peaks['clean'], cap)
+        self.assertGreater(peaks['load'], cap)
@@ -8,8 +8,10 @@ from django.urls import reverse
 from django import forms
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from posts.models import Post, Group, Comment, Follow
+from posts.models import Post, Group, Comment, Follow, TimelineEntry
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -49,6 +51,7 @@ class PostViewTest(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.user = PostViewTest.user
         self.authorized_client = Client()
@@ -197,25 +200,61 @@ class PostViewTest(TestCase):
         self.assertEqual(count_comments, Comment.objects.count())
 
     def test_index_cache(self):
+        """Главная отдаётся из кеша, но новый пост виден сразу."""
         cache.clear()
-        response_one = self.guest_client.get(reverse('posts:index'))
-        response_one_content = response_one.content
-        response_one.context['page_obj'][0].delete()
-        form_data = {
-            'text': 'Тестовый текст',
-        }
+        self.guest_client.get(reverse('posts:index'))
+        with self.assertNumQueries(0):
+            self.guest_client.get(reverse('posts:index'))
         self.authorized_client.post(
             reverse('posts:post_create'),
-            data=form_data,
-            follow=True
+            data={'text': 'Свежий пост'},
         )
-        response_two = self.guest_client.get(reverse('posts:index'))
-        response_two_content = response_two.content
-        self.assertEqual(response_one_content, response_two_content)
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(response.context['page_obj'][0].text, 'Свежий пост')
+
+    def test_feed_cache_invalidation(self):
+        """Правка поста, группы и комментарий сбрасывают кеш лент."""
         cache.clear()
-        response_three = self.guest_client.get(reverse('posts:index'))
-        response_three_content = response_three.content
-        self.assertNotEqual(response_two_content, response_three_content)
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        Comment.objects.create(post=self.post, author=self.user2, text='К')
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(
+                    response.context['page_obj'][0].comments_count, 1
+                )
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(
+            response.context['page_obj'][0].group.title, 'Новое название'
+        )
+
+    def test_feed_cache_author_rename(self):
+        """Новое имя автора видно в закешированных лентах сразу."""
+        cache.clear()
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for url in urls:
+            self.authorized_client2.get(url)
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = 'Новое'
+        author.last_name = 'Имя'
+        author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client2.get(url)
+                self.assertContains(response, 'Новое Имя')
 
     def test_follow(self):
         ''' Авторизованнный клиент может подписаться на автора '''
@@ -283,6 +322,7 @@ class PostPaginatorTest(TestCase):
             )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -337,3 +377,172 @@ class PostPaginatorTest(TestCase):
         self.assertEqual(len(
             response.context['page_obj']), self.cnt_obj - settings.OBJ_IN_PAGE
         )
+
+
+@override_settings(PAGINATION_MODE='cursor')
+class PostCursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestMan')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for i in range(settings.OBJ_IN_PAGE + 3):
+            Post.objects.create(
+                group=cls.group,
+                author=cls.user,
+                text=f'Пост {i}',
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+
+    def test_cursor_pages(self):
+        """Курсоры after/before листают ленту без пропусков и повторов."""
+        expected = list(
+            Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True
+            )
+        )
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url).context['page_obj']
+                self.assertFalse(first.has_previous())
+                self.assertTrue(first.has_next())
+                second = self.client.get(
+                    url + f'?after={first.next_cursor}'
+                ).context['page_obj']
+                self.assertFalse(second.has_next())
+                self.assertEqual(
+                    [post.pk for post in first] + [post.pk for post in second],
+                    expected,
+                )
+                back = self.client.get(
+                    url + f'?before={second.previous_cursor}'
+                ).context['page_obj']
+                self.assertEqual(
+                    [post.pk for post in back], [post.pk for post in first]
+                )
+                self.assertFalse(back.has_previous())
+
+    def test_cursor_page_has_no_count(self):
+        """Страница курсора не выполняет COUNT(*)."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:index'))
+        self.assertFalse(
+            [q for q in queries if 'COUNT(' in q['sql'].upper()]
+        )
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый токен курсора открывает первую страницу."""
+        response = self.client.get(reverse('posts:index') + '?after=@@@')
+        self.assertEqual(
+            len(response.context['page_obj']), settings.OBJ_IN_PAGE
+        )
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Author')
+        cls.old_post = Post.objects.create(author=cls.author, text='Старый')
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка дополняет ленту, отписка её очищает."""
+        self.client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author})
+        )
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.old_post
+        ).exists())
+        self.client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author})
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists()
+        )
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост раскладывается в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый')
+        entry = TimelineEntry.objects.get(user=self.reader, post=post)
+        self.assertEqual(entry.pub_date, post.pub_date)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [post, self.old_post]
+        )
+
+    @override_settings(PAGINATION_MODE='cursor')
+    def test_follow_index_cursor_pages(self):
+        """Лента подписок листается курсорами."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        for i in range(settings.OBJ_IN_PAGE):
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+        first = self.client.get(
+            reverse('posts:follow_index')
+        ).context['page_obj']
+        second = self.client.get(
+            reverse('posts:follow_index') + f'?after={first.next_cursor}'
+        ).context['page_obj']
+        self.assertEqual(len(first), settings.OBJ_IN_PAGE)
+        self.assertEqual(list(second), [self.old_post])
+
+
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestMan')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        for i in range(settings.COMMENTS_IN_PAGE + 5):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_shows_first_comments(self):
+        """Страница поста выводит только первую порцию комментариев."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), settings.COMMENTS_IN_PAGE)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertIsNotNone(response.context['next_cursor'])
+
+    def test_load_more_fragment(self):
+        """Фрагмент «Показать ещё» отдаёт следующую порцию по курсору."""
+        first = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'after': first.context['next_cursor']},
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            [
+                f'Комментарий {i}'
+                for i in range(
+                    settings.COMMENTS_IN_PAGE, settings.COMMENTS_IN_PAGE + 5
+                )
+            ],
+        )
+        self.assertIsNone(response.context['next_cursor'])
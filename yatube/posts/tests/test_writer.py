@@ -0,0 +1,112 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+from posts.writer import WriteQueue, run_write
+
+User = get_user_model()
+
+
+def _blocking_job(started, release):
+    started.set()
+    release.wait(5)
+
+
+class WriteQueueTest(TransactionTestCase):
+    def setUp(self):
+        self.queue = WriteQueue()
+
+    def _hold_writer(self):
+        started, release = threading.Event(), threading.Event()
+        first = self.queue.submit(_blocking_job, started, release)
+        started.wait(5)
+        return first, release
+
+    def test_waiting_jobs_share_one_commit(self):
+        """Задания, накопившиеся за время коммита, идут одной пачкой."""
+        first, release = self._hold_writer()
+        futures = [
+            self.queue.submit(
+                Group.objects.create,
+                title=f'Группа {i}', slug=f'group-{i}', description='-',
+            )
+            for i in range(4)
+        ]
+        release.set()
+        first.result(5)
+        groups = [future.result(5) for future in futures]
+        self.assertEqual(self.queue.batches, 2)
+        self.assertEqual(self.queue.jobs, 5)
+        self.assertEqual(Group.objects.count(), len(groups))
+
+    def test_failed_job_does_not_roll_back_batch(self):
+        """Ошибка одного задания откатывает только его."""
+        first, release = self._hold_writer()
+        create = Group.objects.create
+        ok = self.queue.submit(create, title='А', slug='a', description='-')
+        duplicate = self.queue.submit(
+            create, title='А', slug='a', description='-'
+        )
+        other = self.queue.submit(create, title='Б', slug='b', description='-')
+        release.set()
+        ok.result(5)
+        other.result(5)
+        with self.assertRaises(IntegrityError):
+            duplicate.result(5)
+        self.assertEqual(self.queue.batches, 2)
+        self.assertEqual(
+            sorted(Group.objects.values_list('slug', flat=True)), ['a', 'b']
+        )
+
+    def test_on_commit_error_keeps_results(self):
+        """Ошибка колбэка после коммита не превращает записи в ошибки."""
+        def create_and_fail_later():
+            transaction.on_commit(lambda: 1 / 0)
+            return Group.objects.create(title='А', slug='a', description='-')
+
+        with self.assertLogs('posts.writer', 'ERROR'):
+            group = self.queue.submit(create_and_fail_later).result(5)
+            # Лог пишется после результата: ждём и его.
+            self.queue.submit(lambda: None).result(5)
+        self.assertEqual(group.slug, 'a')
+        self.assertTrue(Group.objects.filter(slug='a').exists())
+
+
+@override_settings(WRITE_DISPATCH=True)
+class WriteDispatchViewsTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='TestMan')
+        self.post = Post.objects.create(author=self.user, text='Пост')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_writes_run_in_writer_thread(self):
+        """Запись выполняется потоком записи."""
+        self.assertEqual(
+            run_write(lambda: threading.current_thread().name),
+            'yatube-writer',
+        )
+
+    def test_read_your_writes(self):
+        """После ответа view изменение уже видно читающему потоку."""
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий'},
+        )
+        self.assertTrue(Comment.objects.filter(text='Комментарий').exists())
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertContains(response, 'Комментарий')
+
+    def test_open_transaction_writes_inline(self):
+        """Внутри транзакции вызывающего запись идёт на месте."""
+        with transaction.atomic():
+            self.assertEqual(
+                run_write(lambda: threading.current_thread().name),
+                threading.current_thread().name,
+            )
@@ -0,0 +1,212 @@
+"""Превью картинок постов считаются в фоне, а не при первом показе.
+
+Шаблоны получают превью через DeferredThumbnailBackend: он отдаёт
+только готовые превью из KV store sorl. Если превью ещё нет, задание
+уходит в пул потоков, а шаблон показывает исходную картинку.
+Сохранение поста сразу ставит в очередь все варианты из variants(),
+запрос их не ждёт. Пул свой у каждого процесса, одно и то же превью
+одновременно считается только один раз.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from PIL import features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import tokey
+from sorl.thumbnail.images import ImageFile
+
+from .cache import invalidate, post_tags
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд не повторять превью, которое не удалось посчитать.
+RETRY_AFTER = 60 * 60
+
+_pending = {}
+_lock = threading.Lock()
+_executor = None
+
+
+class DeferredThumbnailBackend(ThumbnailBackend):
+    """Бэкенд для пути запроса: никогда не обрабатывает картинки сам."""
+
+    def get_thumbnail(self, file_, geometry_string, tags=None, **options):
+        """Готовое превью или None; tags — теги страниц с картинкой,
+        которые сбросить, когда превью посчитается (см. schedule)."""
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        # Ключ превью считается по имени: в KV store sorl входит и
+        # хранилище исходника, а фоновая сборка знает только имя.
+        name = getattr(file_, 'name', file_)
+        cached = self.lookup(name, geometry_string, options)
+        if cached:
+            return cached
+        schedule(name, geometry_string, options, tags)
+        return None
+
+    def lookup(self, file_, geometry_string, options):
+        """Готовое превью из KV store или None."""
+        thumbnail = ImageFile(
+            self._get_thumbnail_filename(
+                ImageFile(file_), geometry_string,
+                self._full_options(file_, options),
+            ),
+            default.storage,
+        )
+        return default.kvstore.get(thumbnail)
+
+    def _full_options(self, file_, options):
+        # Те же умолчания, что в ThumbnailBackend.get_thumbnail: от них
+        # зависит имя файла превью.
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(ImageFile(file_)))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+
+def supported_formats():
+    """Форматы из POST_IMAGE_FORMATS, которые умеет записывать Pillow."""
+    return [
+        fmt for fmt in settings.POST_IMAGE_FORMATS
+        if fmt != 'WEBP' or features.check('webp')
+    ]
+
+
+def variants():
+    """(формат, ширина, геометрия, опции) всех вариантов картинки поста.
+
+    Варианты одного формата идут по возрастанию ширины и сохраняют
+    пропорции карточки POST_IMAGE_SIZE.
+    """
+    width, height = settings.POST_IMAGE_SIZE
+    for fmt in supported_formats():
+        for variant_width in sorted(settings.POST_IMAGE_WIDTHS):
+            variant_height = round(variant_width * height / width)
+            yield (
+                fmt, variant_width, f'{variant_width}x{variant_height}',
+                dict(settings.POST_IMAGE_OPTIONS, format=fmt),
+            )
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='yatube-thumbnail',
+            )
+        return _executor
+
+
+def _failed_key(key):
+    return f'thumbnail:failed:{key}'
+
+
+def schedule(name, geometry, options, tags=None):
+    """Ставит превью в очередь; возвращает Future или None.
+
+    После расчёта сбрасываются tags: страницы с исходной картинкой
+    лежат в кеше. Без tags теги ищутся по всем постам с этой картинкой
+    на каждом шарде.
+    """
+    key = tokey(name, geometry, sorted(options.items()))
+    if cache.get(_failed_key(key)):
+        return None
+    executor = _get_executor()
+    with _lock:
+        # Задание убирает себя из _pending под той же блокировкой,
+        # поэтому не закончится раньше, чем его туда запишут.
+        if key not in _pending:
+            _pending[key] = executor.submit(
+                _generate, key, name, geometry, options, tags
+            )
+        return _pending[key]
+
+
+def schedule_post(post):
+    """Ставит в очередь все превью картинки поста."""
+    if not post.image:
+        return []
+    futures = [
+        schedule(post.image.name, geometry, options, post_tags(post))
+        for _, _, geometry, options in variants()
+    ]
+    return [future for future in futures if future is not None]
+
+
+def _image_tags(name):
+    tags = set()
+    for shard in settings.POST_SHARDS:
+        for post in Post.objects.using(shard).filter(image=name).only(
+            'author_id', 'group_id'
+        ):
+            tags.update(post_tags(post))
+    return tags
+
+
+def _generate(key, name, geometry, options, tags):
+    try:
+        cached = DeferredThumbnailBackend().lookup(name, geometry, options)
+        if cached:
+            return cached
+        thumbnail = ThumbnailBackend().get_thumbnail(
+            name, geometry, **options
+        )
+        if default.kvstore.get(thumbnail) is None:
+            # sorl не смог открыть исходник и ничего не записал.
+            cache.set(_failed_key(key), True, RETRY_AFTER)
+            return None
+        invalidate(*(tags if tags is not None else _image_tags(name)))
+        return thumbnail
+    except Exception:
+        logger.exception('Не удалось посчитать превью %s %s', name, geometry)
+        cache.set(_failed_key(key), True, RETRY_AFTER)
+        return None
+    finally:
+        with _lock:
+            _pending.pop(key, None)
+        close_old_connections()
+
+
+def build(name, force=False):
+    """Строит на месте все варианты картинки поста.
+
+    Готовые превью пропускаются, с force строятся заново. Возвращает
+    размер записанных файлов в байтах: 0 — всё уже было.
+    """
+    written = 0
+    for _, _, geometry, options in variants():
+        cached = DeferredThumbnailBackend().lookup(name, geometry, options)
+        if cached and cached.exists() and not force:
+            continue
+        if cached:
+            default.kvstore.delete(cached, delete_thumbnails=False)
+            cached.delete()
+        thumbnail = ThumbnailBackend().get_thumbnail(
+            name, geometry, **options
+        )
+        # Без файла (исходник не открылся) size() бросит исключение.
+        written += thumbnail.storage.size(thumbnail.name)
+    return written
+
+
+def wait_pending(timeout=None):
+    """Ждёт превью, поставленные в очередь к этому моменту."""
+    with _lock:
+        futures = list(_pending.values())
+    wait(futures, timeout)
@@ -0,0 +1,105 @@
+"""Загрузка картинок постов с ограниченной памятью.
+
+Тело загрузки пишется во временный файл кусками и не дальше
+POST_IMAGE_MAX_BYTES. Картинка проверяется по заголовку (Image.open без
+load()): формат, размеры и число пикселей. Слишком большая уменьшается
+до POST_IMAGE_MAX_SIDE; JPEG при этом масштабируется ещё при чтении
+(draft), поэтому в памяти не бывает больше POST_IMAGE_DECODE_PIXELS
+пикселей. Картинка, которую так не уменьшить, отклоняется.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+ALLOWED_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет файл на диск и отбрасывает всё после POST_IMAGE_MAX_BYTES.
+
+    Размер файла остаётся настоящим: формы поста (PostImageMixin) увидят
+    превышение и покажут ошибку, а не сохранят обрезанный файл.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        return super().file_complete(self.received)
+
+
+def _too_large(message):
+    return ValidationError(message, code='image_too_large')
+
+
+def _source(upload):
+    if hasattr(upload, 'temporary_file_path'):
+        return upload.temporary_file_path()
+    upload.seek(0)
+    return upload
+
+
+def check_size(upload):
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise _too_large(
+            f'Файл больше {filesizeformat(settings.POST_IMAGE_MAX_BYTES)}.'
+        )
+
+
+def clean_image(upload):
+    """Проверяет загруженную картинку; возвращает её или уменьшенную копию."""
+    check_size(upload)
+    try:
+        image = Image.open(_source(upload))
+    except Image.DecompressionBombError:
+        raise _too_large('Слишком много пикселей.')
+    with image:
+        if image.format not in ALLOWED_FORMATS:
+            raise ValidationError(
+                'Поддерживаются JPEG, PNG, GIF и WebP.', code='invalid_image'
+            )
+        width, height = image.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise _too_large('Слишком много пикселей.')
+        side = settings.POST_IMAGE_MAX_SIDE
+        if max(width, height) <= side:
+            return upload
+        return _downscale(image, upload, side)
+
+
+def _downscale(image, upload, side):
+    # Для JPEG draft уменьшает в 2-8 раз при декодировании.
+    fmt = image.format
+    image.draft(image.mode, (side, side))
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_DECODE_PIXELS:
+        raise _too_large(
+            f'Картинка больше {side} пикселей по стороне; загрузите JPEG '
+            'или уменьшите её.'
+        )
+    image.thumbnail((side, side))
+    # Уменьшенная копия невелика: до FILE_UPLOAD_MAX_MEMORY_SIZE в
+    # памяти, дальше на диске.
+    result = UploadedFile(
+        tempfile.SpooledTemporaryFile(settings.FILE_UPLOAD_MAX_MEMORY_SIZE),
+        os.path.basename(upload.name), upload.content_type, 0,
+        upload.charset,
+    )
+    options = {'quality': 90} if fmt == 'JPEG' else {}
+    image.save(result, format=fmt, **options)
+    result.size = result.tell()
+    result.seek(0)
+    return result
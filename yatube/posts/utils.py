@@ -1,11 +1,130 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 
 
 def obj_in_page(request):
     return 10
 
 
-def posts_paginator(request, obj, count):
+def encode_cursor(obj, tiebreak='pk', date_field='pub_date'):
+    """Непрозрачный токен курсора по ключу (дата, id)."""
+    moment = getattr(obj, date_field)
+    raw = f'{moment.isoformat()}|{getattr(obj, tiebreak)}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбирает токен курсора; для битого токена возвращает None."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        pub_date, pk = raw.rsplit('|', 1)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPage(Page):
+    """Страница ленты без номера: переход по курсорам after/before."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+        # Курсоры считаются сразу: вызывающий код может заменить
+        # object_list (например, записи ленты на сами посты).
+        tiebreak = paginator.tiebreak
+        self.next_cursor = None
+        self.previous_cursor = None
+        if has_next and object_list:
+            self.next_cursor = encode_cursor(object_list[-1], tiebreak)
+        if has_previous and object_list:
+            self.previous_cursor = encode_cursor(object_list[0], tiebreak)
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} objects>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по (pub_date, id) без COUNT(*) и OFFSET.
+
+    Стоимость любой страницы — один индексный проход на per_page + 1
+    строк, независимо от глубины.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, tiebreak='pk', **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.tiebreak = tiebreak
+
+    def page_from_cursor(self, after=None, before=None):
+        queryset = self.object_list
+        size = self.per_page
+        tiebreak = self.tiebreak
+        if before is not None:
+            pub_date, pk = before
+            rows = list(queryset.filter(
+                Q(pub_date__gt=pub_date)
+                | Q(pub_date=pub_date, **{f'{tiebreak}__gt': pk})
+            ).order_by('pub_date', tiebreak)[:size + 1])
+            has_previous = len(rows) > size
+            rows = rows[:size][::-1]
+            return CursorPage(rows, self, True, has_previous)
+        if after is not None:
+            pub_date, pk = after
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date)
+                | Q(pub_date=pub_date, **{f'{tiebreak}__lt': pk})
+            )
+        rows = list(
+            queryset.order_by('-pub_date', f'-{tiebreak}')[:size + 1]
+        )
+        has_next = len(rows) > size
+        return CursorPage(rows[:size], self, has_next, after is not None)
+
+
+def comments_page(comments, after, count):
+    """Порция комментариев по (created, id) после курсора after.
+
+    Возвращает комментарии и курсор следующей порции (или None).
+    """
+    comments = comments.order_by('created', 'pk')
+    if after is not None:
+        created, pk = after
+        comments = comments.filter(
+            Q(created__gt=created) | Q(created=created, pk__gt=pk)
+        )
+    rows = list(comments[:count + 1])
+    next_cursor = None
+    if len(rows) > count:
+        next_cursor = encode_cursor(rows[count - 1], date_field='created')
+    return rows[:count], next_cursor
+
+
+def posts_paginator(request, obj, count, tiebreak='pk'):
+    if getattr(settings, 'PAGINATION_MODE', 'page') == 'cursor':
+        paginator = CursorPaginator(obj, count, tiebreak=tiebreak)
+        return paginator.page_from_cursor(
+            after=decode_cursor(request.GET.get('after')),
+            before=decode_cursor(request.GET.get('before')),
+        )
     page_number = request.GET.get('page')
     paginator = Paginator(obj, count)
     page_obj = paginator.get_page(page_number)
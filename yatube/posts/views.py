@@ -1,27 +1,82 @@
+from django.http import HttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
 
-from .models import Post, Group, User, Follow
+from .models import AuthorStats, Group, User, Follow, TimelineEntry
 from .forms import PostForm, CommentForm
-from .utils import posts_paginator
+from .cache import add_page_tags, cached_feed_page, conditional_page
+from .middleware import page_cache_metrics
+from .search import decode_search_cursor, search_posts
+from .sharding import (
+    is_sharded, post_queryset, scatter_posts, timeline_posts,
+)
+from .utils import comments_page, decode_cursor, posts_paginator
+from .writer import run_write
 
 
+def index_validators(request):
+    return ['feed']
+
+
+def group_validators(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    if group_id is None:
+        return None
+    return [f'group:{group_id}']
+
+
+def profile_validators(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    return [f'author:{author_id}', 'groups']
+
+
+def post_detail_validators(request, post_id):
+    row = post_queryset(post_id).filter(pk=post_id).values_list(
+        'author_id', 'group_id'
+    ).first()
+    if row is None:
+        return None
+    author_id, group_id = row
+    tags = [f'post:{post_id}', f'author:{author_id}']
+    if group_id:
+        tags.append(f'group:{group_id}')
+    return tags
+
+
+@conditional_page(index_validators)
 def index(request):
     template = 'posts/index.html'
-    posts = Post.objects.all()
-    page_obj = posts_paginator(request, posts, settings.OBJ_IN_PAGE)
+    add_page_tags(request, 'feed')
+    page_obj = cached_feed_page(
+        request, 'index', ['feed'],
+        lambda: posts_paginator(
+            request, scatter_posts(), settings.OBJ_IN_PAGE
+        ),
+    )
     context = {
         'page_obj': page_obj,
     }
     return render(request, template, context)
 
 
+@conditional_page(group_validators)
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    posts = group.group_posts.all()
-    page_obj = posts_paginator(request, posts, settings.OBJ_IN_PAGE)
+    add_page_tags(request, f'group:{group.pk}')
+    page_obj = cached_feed_page(
+        request, f'group:{group.pk}', [f'group:{group.pk}'],
+        lambda: posts_paginator(
+            request, scatter_posts(group=group), settings.OBJ_IN_PAGE
+        ),
+    )
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -29,12 +84,21 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@conditional_page(profile_validators)
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
+    user = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
     template = 'posts/profile.html'
-    posts = user.author_posts.all()
-    posts_count = posts.count()
-    page_obj = posts_paginator(request, posts, settings.OBJ_IN_PAGE)
+    # До прогона recount_stats строки счётчиков может не быть.
+    stats = getattr(user, 'stats', None) or AuthorStats(user=user)
+    add_page_tags(request, f'author:{user.pk}', 'groups')
+    page_obj = cached_feed_page(
+        request, f'author:{user.pk}', [f'author:{user.pk}', 'groups'],
+        lambda: posts_paginator(
+            request, user.author_posts.feed(), settings.OBJ_IN_PAGE
+        ),
+    )
     not_my_page = request.user != user
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user,
@@ -43,33 +107,91 @@ def profile(request, username):
     context = {
         'page_obj': page_obj,
         'profile': user,
-        'posts_count': posts_count,
+        'posts_count': stats.posts_count,
+        'stats': stats,
         'following': following,
         'not_my_page': not_my_page,
     }
     return render(request, template, context)
 
 
+@conditional_page(post_detail_validators)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(post_queryset(post_id).feed(), id=post_id)
+    add_page_tags(
+        request,
+        f'post:{post.pk}',
+        f'author:{post.author_id}',
+        post.group_id and f'group:{post.group_id}',
+    )
+    comments, next_cursor = comments_page(
+        post.comments.with_related('author'), None,
+        settings.COMMENTS_IN_PAGE,
+    )
     form = CommentForm()
     context = {
         'post': post,
         'form': form,
         'comments': comments,
+        'next_cursor': next_cursor,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    post = get_object_or_404(post_queryset(post_id).only('pk'), id=post_id)
+    add_page_tags(request, f'post:{post.pk}')
+    comments, next_cursor = comments_page(
+        post.comments.with_related('author'),
+        decode_cursor(request.GET.get('after')),
+        settings.COMMENTS_IN_PAGE,
+    )
+    context = {
+        'post': post,
+        'comments': comments,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+def search(request):
+    """Полнотекстовый поиск по постам с фильтром по группе и автору."""
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    group = author = None
+    if request.GET.get('group'):
+        group = get_object_or_404(Group, slug=request.GET['group'])
+    if request.GET.get('author'):
+        author = get_object_or_404(User, username=request.GET['author'])
+    results, next_cursor = search_posts(
+        query,
+        settings.OBJ_IN_PAGE,
+        group=group,
+        author=author,
+        after=decode_search_cursor(request.GET.get('after')),
+    )
+    params = request.GET.copy()
+    params.pop('after', None)
+    context = {
+        'query': query,
+        'group': group,
+        'author': author,
+        'results': results,
+        'next_cursor': next_cursor,
+        'params': params.urlencode(),
+    }
+    return render(request, template, context)
+
+
 @login_required
 def post_create(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     template = 'posts/create_post.html'
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        run_write(post.save)
         return redirect('posts:profile', username=request.user)
     context = {
         'form': form,
@@ -81,14 +203,14 @@ def post_create(request):
 @login_required
 def post_edit(request, post_id):
     template = 'posts/create_post.html'
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(post_queryset(post_id), id=post_id)
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
         instance=post
     )
     if form.is_valid():
-        post.save()
+        run_write(post.save)
         return redirect('posts:post_detail', post.id)
     context = {
         'form': form,
@@ -100,13 +222,13 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(post_queryset(post_id), id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        run_write(comment.save)
     return redirect('posts:post_detail', post_id=post_id)
 
 
@@ -114,8 +236,15 @@ def add_comment(request, post_id):
 def follow_index(request):
     template = 'posts/follow.html'
     title = 'Посты из подписок'
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = posts_paginator(request, post_list, settings.OBJ_IN_PAGE)
+    # Лента материализована в TimelineEntry: индексный диапазон
+    # по (user, pub_date) вместо join Follow x Post с сортировкой.
+    entries = TimelineEntry.objects.filter(user=request.user)
+    if not is_sharded():
+        entries = entries.select_related('post__author', 'post__group')
+    page_obj = posts_paginator(
+        request, entries, settings.OBJ_IN_PAGE, tiebreak='post_id'
+    )
+    page_obj.object_list = timeline_posts(page_obj.object_list)
     context = {
         'template': template,
         'title': title,
@@ -129,7 +258,9 @@ def profile_follow(request, username):
     """Активация подписки на автора."""
     user = get_object_or_404(User, username=username)
     if request.user != user:
-        Follow.objects.get_or_create(author=user, user=request.user)
+        run_write(
+            Follow.objects.get_or_create, author=user, user=request.user
+        )
     return redirect('posts:profile', username=username)
 
 
@@ -138,5 +269,16 @@ def profile_unfollow(request, username):
     """Отписка от автора."""
     author = get_object_or_404(User, username=username)
     follow = Follow.objects.filter(user=request.user, author=author)
-    follow.delete()
+    run_write(follow.delete)
     return redirect('posts:profile', username)
+
+
+def page_cache_stats(request):
+    """Счётчики кеша страниц в текстовом формате Prometheus."""
+    lines = [
+        f'yatube_page_cache_{name}_total {value}'
+        for name, value in page_cache_metrics().items()
+    ]
+    return HttpResponse(
+        '\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4'
+    )
@@ -0,0 +1,118 @@
+"""Очередь записи: изменения из views выполняет один поток.
+
+SQLite допускает одного писателя одновременно. При WRITE_DISPATCH = True
+записи из потоков-обработчиков собираются в пачку и фиксируются одной
+транзакцией (group commit), а не соревнуются за блокировку. Вызывающий
+ждёт коммита своей пачки, поэтому его следующее чтение уже видит
+собственные изменения. Очередь своя у каждого процесса.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueue:
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+        self.batches = 0
+        self.jobs = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        self._start()
+        self._queue.put((future, func, args, kwargs))
+        return future
+
+    def in_writer(self):
+        return threading.current_thread() is self._thread
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._loop, name='yatube-writer', daemon=True
+                )
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            self._run_batch(self._collect())
+            connections[self.using].close_if_unusable_or_obsolete()
+
+    def _collect(self):
+        """Первое задание ждётся без ограничений, остальные — не дольше
+        WRITE_BATCH_WAIT секунд."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + settings.WRITE_BATCH_WAIT
+        while len(batch) < settings.WRITE_BATCH_SIZE:
+            try:
+                batch.append(self._queue.get(
+                    timeout=max(deadline - time.monotonic(), 0)
+                ))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_batch(self, batch):
+        batch = [job for job in batch if job[0].set_running_or_notify_cancel()]
+        outcomes = []
+        committed = []
+
+        def resolve():
+            # Первый из on_commit: результаты отдаются сразу после коммита,
+            # ошибка в колбэках заданий их уже не тронет.
+            committed.append(True)
+            self._resolve(batch, outcomes)
+
+        try:
+            with transaction.atomic(using=self.using):
+                transaction.on_commit(resolve, using=self.using)
+                for future, func, args, kwargs in batch:
+                    # Ошибка одного задания откатывает только его savepoint.
+                    try:
+                        with transaction.atomic(using=self.using):
+                            outcomes.append((func(*args, **kwargs), None))
+                    except Exception as error:
+                        outcomes.append((None, error))
+        except Exception as error:
+            if committed:
+                logger.exception('Ошибка в on_commit после записи пачки')
+                return
+            for future, *_ in batch:
+                future.set_exception(error)
+
+    def _resolve(self, batch, outcomes):
+        self.batches += 1
+        self.jobs += len(batch)
+        for (future, *_), (result, error) in zip(batch, outcomes):
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+write_queue = WriteQueue()
+
+
+def run_write(func, *args, **kwargs):
+    """Выполняет func(*args, **kwargs) как запись и возвращает результат.
+
+    Без WRITE_DISPATCH, в самом потоке записи или внутри открытой
+    транзакции (её снимок и блокировки не дали бы потоку записи
+    закончить) функция выполняется на месте в transaction.atomic.
+    """
+    if (not settings.WRITE_DISPATCH or write_queue.in_writer()
+            or connections[write_queue.using].in_atomic_block):
+        with transaction.atomic(using=write_queue.using):
+            return func(*args, **kwargs)
+    return write_queue.submit(func, *args, **kwargs).result()
@@ -52,6 +52,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # MEDIA_URL и STATIC_URL отдаются до всего остального (posts.media,
+    # posts.staticfiles)
+    'posts.middleware.MediaMiddleware',
+    'posts.middleware.StaticMiddleware',
+    # 304 и для ответов, отданных кешем страниц
+    'django.middleware.http.ConditionalGetMiddleware',
+    'posts.middleware.PageCacheMiddleware',
+    # До первого обращения к базе: сессии читаются уже через роутер
+    'posts.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,6 +68,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # 503 на запись автора, чьи посты переезжают между шардами
+    'posts.middleware.AuthorMovingMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -93,11 +104,65 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами вместо открытия файла заново
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            # Секунды ожидания блокировки записи вместо 'database is locked'
+            'timeout': 20,
+        },
     }
 }
 
+# Реплики для чтения: алиасы из DATABASES, копии основной базы, которые
+# обновляет manage.py refresh_replicas (SQLite backup API), например
+#   DATABASES['replica'] = {'ENGINE': ..., 'NAME': 'replica.sqlite3'}
+#   DATABASE_REPLICAS = ['replica']
+DATABASE_REPLICAS = []
+# ShardRouter раньше ReplicaRouter: остальные модели читаются с реплик
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'posts.routers.ReplicaRouter',
+]
+# Реплика, отстающая сильнее, не используется; столько же секунд после
+# своей записи клиент не читает копии, сделанные до неё
+REPLICA_MAX_LAG = 10
+
+# Шарды постов и комментариев (posts.sharding): алиасы из DATABASES.
+# Пользователи, группы, подписки и ленты остаются в 'default'. Авторов
+# между шардами переносит manage.py rebalance_shards
+POST_SHARDS = ['default']
+# Сколько секунд процесс помнит шард автора без перечитывания карты
+SHARD_MAP_TIMEOUT = 5
+
+# PRAGMA для каждого нового соединения SQLite (posts.db, connection_created).
+# WAL: читатели не блокируют писателя и наоборот; synchronous=NORMAL в WAL
+# не теряет согласованность, только последние транзакции при сбое питания.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — размер в КиБ: 64 МиБ кеша страниц
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Cache-Control для файлов, названных не по содержимому (превью sorl);
+# картинки постов по хешу кешируются навсегда.
+MEDIA_MAX_AGE = 60 * 60
+
+# Загрузки пишутся на диск кусками и не больше POST_IMAGE_MAX_BYTES
+# (posts.uploads). Картинка больше POST_IMAGE_MAX_SIDE по стороне
+# уменьшается; при этом в памяти не больше POST_IMAGE_DECODE_PIXELS
+# пикселей, пик — около 8 байт на пиксель (картинка и промежуточный
+# буфер resize), иначе загрузка отклоняется
+FILE_UPLOAD_HANDLERS = ['posts.uploads.LimitedUploadHandler']
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_DECODE_PIXELS = 16 * 1000 * 1000
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -136,6 +201,9 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
+# collectstatic пишет сюда имена с хешем и .gz рядом (posts.staticfiles)
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATICFILES_STORAGE = 'posts.staticfiles.CompressedManifestStorage'
 
 LOGIN_URL = 'users:login'
 
@@ -149,8 +217,53 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 OBJ_IN_PAGE = 10
 
+COMMENTS_IN_PAGE = 20
+
+# Варианты картинки поста для srcset: пропорции карточки, ширины и
+# форматы по убыванию предпочтения (последний — для <img>); форматы,
+# которых не умеет Pillow, пропускаются. Считаются в фоне после
+# сохранения поста, шаблоны их не строят (posts.thumbnails)
+POST_IMAGE_SIZE = (960, 339)
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')
+POST_IMAGE_OPTIONS = {'crop': 'center', 'upscale': True, 'quality': 80}
+THUMBNAIL_BACKEND = 'posts.thumbnails.DeferredThumbnailBackend'
+THUMBNAIL_WORKERS = 2
+# Метаданные превью — в файле SQLite, общем для всех процессов
+# (posts.kvstore). None — MEDIA_ROOT/cache/thumbnails.sqlite3, рядом
+# с самими превью; файл должен лежать на локальном диске
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'
+THUMBNAIL_KVSTORE_PATH = None
+
+# Общий кеш всех процессов сервера в файле SQLite (posts.sqlitecache):
+# страницы и превью кешируются один раз, а не в каждом воркере. Тесты
+# берут кеш своего процесса из yatube.test_settings: файл пережил бы
+# прогон и отдал страницы прежней тестовой базы
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'posts.sqlitecache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 100000},
     }
 }
+# manage.py test без --settings тоже берёт настройки yatube.test_settings
+TEST_RUNNER = 'yatube.test_runner.TestRunner'
+
+# 'page' — классическая нумерация ?page=N,
+# 'cursor' — keyset-пагинация ?after=/?before= без COUNT(*) и OFFSET
+PAGINATION_MODE = 'page'
+
+# Страницы лент кешируются надолго: свежесть обеспечивают версии тегов
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Кеш целых страниц для анонимных читателей (posts.middleware)
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Записи из views через один поток с групповым коммитом (posts.writer)
+WRITE_DISPATCH = False
+WRITE_BATCH_SIZE = 100
+# Сколько секунд поток записи добирает задания в пачку; при 0 берёт
+# только уже ждущие — новые копятся, пока коммитится текущая пачка
+WRITE_BATCH_WAIT = 0
@@ -0,0 +1,9 @@
+"""Настройки тестов: pytest (pytest.ini) и manage.py test (TEST_RUNNER)."""
+from .settings import *  # noqa: F401,F403
+
+# Кеш своего процесса, пустой в начале каждого прогона
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}